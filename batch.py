@@ -0,0 +1,256 @@
+'''
+Mind 的离线批量请求
+
+用法:
+    batch = MindBatch('gpt-4o-mini', key, endpoint, checkpoint='batch.jsonl', concurrency=32)
+    for item in batch.run(conversations, temperature=0):
+        print(item.index, item.ok, item.result)
+
+    # 生成供应商 /v1/batches 接口使用的 JSONL
+    batch.export(conversations, 'requests.jsonl', temperature=0)
+
+每条对话可以是一段用户文本、一条消息字典或消息列表。已完成的结果追加保存在 checkpoint 文件中，
+中断后以相同的对话再次运行时，已完成的条目直接从文件中读取，不会重新请求
+'''
+from typing             import Any, Callable, Dict, Iterable, Iterator, List, Union
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses        import dataclass, asdict
+from .identify          import Mind, Identify, Endpoint, EndpointPool, to_dict_recursive
+import threading
+import hashlib
+import random
+import json
+import time
+import os
+
+
+Conversation = Union[str, Dict[str, Any], List[Dict[str, Any]]]
+
+
+@dataclass
+class BatchItem:
+    '''
+    单条对话的结果
+
+    Attributes:
+        index: 对话在输入中的位置
+        key: 对话内容的哈希，用于在恢复时确认对话未被修改
+        result: Mind.request 的返回值
+        messages: 本次请求追加的消息（assistant 回答与工具结果）
+        error: 失败原因
+        attempts: 请求次数
+    '''
+    index: int
+    key: str
+    result: Dict[str, Any] = None
+    messages: List[Dict[str, Any]] = None
+    error: str = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BatchCheckpoint:
+    '''
+    以 JSONL 追加保存已完成的条目
+
+    同一条目出现多次时以最后一行为准；中断时写了一半的末行会被忽略
+    '''
+    def __init__(self, path: str, fsync: bool=False) -> None:
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> Dict[int, BatchItem]:
+        items = {}
+        if not os.path.exists(self.path):
+            return items
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = BatchItem(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                items[item.index] = item
+        return items
+
+    def append(self, item: BatchItem) -> None:
+        line = json.dumps(asdict(item), ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class MindBatch:
+    '''
+    以有限并发批量执行大量相互独立的对话
+
+    - 每条对话使用新的 Mind，所有 Mind 共用 Identify 与 Mind.clients 中的连接池，
+      并发较高时应通过 Mind.clients.configure 调大 max_connections
+    - 输入按需读取，同时在途的对话不超过 concurrency 的两倍，可以传入生成器
+    - 限流、服务端错误与连接错误按指数退避重试，重试时从原始对话重新开始
+    - 结果按完成顺序返回，并追加写入 checkpoint 文件
+    '''
+    def __init__(self,
+                 model: str|Endpoint|List[Endpoint]|EndpointPool,
+                 key: str=None,
+                 endpoint: str=None,
+                 identify: Identify=None,
+                 concurrency: int=16,
+                 retries: int=3,
+                 backoff: float=1.0,
+                 checkpoint: str=None,
+                 mind_class: type=Mind,
+                 **options) -> None:
+        '''
+        Args:
+            model: 模型名称或端点，与 Mind 相同
+            key: API 密钥
+            endpoint: 接口地址
+            identify: 所有对话共用的工具注册表，为None时创建一个新的
+            concurrency: 同时进行的对话数量
+            retries: 遇到可重试错误时的重试次数
+            backoff: 首次重试前的等待时间（秒），之后每次翻倍
+            checkpoint: 保存结果的 JSONL 文件，为None时不保存
+            mind_class: 使用的 Mind 类
+            **options: 创建 Mind 时的其他参数，如 max_rounds
+        '''
+        self.model = model
+        self.key = key
+        self.endpoint = endpoint
+        self.idf: Identify = identify or Identify()
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.checkpoint = BatchCheckpoint(checkpoint) if checkpoint else None
+        self.mind_class = mind_class
+        self.options = options
+
+        # 新建 Mind 时的回调，可用于设置提示词、context_window 等
+        self.on_create: Callable[[Mind], Any] = None
+
+    @staticmethod
+    def messages(conversation: Conversation) -> List[Dict[str, Any]]:
+        '''将一条对话转换为消息列表'''
+        if isinstance(conversation, str):
+            return [{'role': 'user', 'content': conversation}]
+        if isinstance(conversation, dict):
+            return [conversation]
+        return list(conversation)
+
+    @staticmethod
+    def key_of(messages: List[Dict[str, Any]]) -> str:
+        payload = json.dumps(messages, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def create(self, messages: List[Dict[str, Any]]=()) -> Mind:
+        '''创建一个 Mind 并写入对话消息'''
+        mind = self.mind_class(self.model, self.key, self.endpoint, identify=self.idf, **self.options)
+        if self.on_create:
+            self.on_create(mind)
+        for message in messages:
+            message = dict(message)
+            mind.add_content(message.pop('role'), message.pop('content', None), **message)
+        return mind
+
+    def _run_one(self, index: int, key: str, messages: List[Dict[str, Any]], kwargs: dict) -> BatchItem:
+        item = BatchItem(index=index, key=key)
+        for attempt in range(self.retries + 1):
+            item.attempts = attempt + 1
+            try:
+                mind = self.create(messages)
+                result = mind.request(**kwargs)
+                item.result = to_dict_recursive(result)
+                item.messages = mind._memories[len(messages):]
+                item.error = None
+                break
+            except Exception as e:
+                item.error = f'{type(e).__name__}: {e}'
+                if attempt >= self.retries or not EndpointPool.is_retryable(e):
+                    break
+                time.sleep(min(self.backoff * 2 ** attempt, 60) * random.uniform(0.5, 1.5))
+        if self.checkpoint is not None:
+            self.checkpoint.append(item)
+        return item
+
+    def run(self, conversations: Iterable[Conversation], retry_failed: bool=False, **kwargs) -> Iterator[BatchItem]:
+        '''
+        执行一批对话，按完成顺序逐条返回结果
+
+        Args:
+            conversations: 对话序列，可以是生成器
+            retry_failed: 是否重新执行 checkpoint 中已失败的条目
+            **kwargs: 传给 Mind.request 的参数，不支持 stream
+
+        Returns:
+            Iterator[BatchItem]: 每条对话恰好返回一次，包括直接从 checkpoint 读取的条目
+        '''
+        kwargs.pop('stream', None)
+        done = self.checkpoint.load() if self.checkpoint is not None else {}
+        executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='mind-batch')
+        pending: set[Future] = set()
+        try:
+            for index, conversation in enumerate(conversations):
+                messages = self.messages(conversation)
+                key = self.key_of(messages)
+                previous = done.pop(index, None)
+                if previous is not None and previous.key == key and (previous.ok or not retry_failed):
+                    yield previous
+                    continue
+
+                pending.add(executor.submit(self._run_one, index, key, messages, kwargs))
+                while len(pending) >= self.concurrency * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        yield future.result()
+
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        finally:
+            # 调用方提前结束迭代时放弃尚未开始的对话，已开始的对话完成后仍会写入 checkpoint
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+    def export(self, conversations: Iterable[Conversation], path: str,
+               url: str='/v1/chat/completions', **kwargs) -> int:
+        '''
+        将对话写为供应商批量接口（/v1/batches）使用的 JSONL 文件
+
+        每行的请求体与 Mind.request 第一轮发送的参数相同（含预设提示词与工具），
+        custom_id 为 request-<index>。批量接口无法执行工具，模型返回的工具调用需自行处理
+
+        Args:
+            conversations: 对话序列
+            path: 输出文件
+            url: 请求路径
+            **kwargs: 写入请求体的其他参数，如 temperature
+
+        Returns:
+            int: 写入的请求数量
+        '''
+        kwargs.pop('stream', None)
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for index, conversation in enumerate(conversations):
+                mind = self.create(self.messages(conversation))
+                body = to_dict_recursive(mind._completion_args(0, kwargs))
+                line = {'custom_id': f'request-{index}', 'method': 'POST', 'url': url, 'body': body}
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+                count += 1
+        return count
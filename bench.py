@@ -0,0 +1,652 @@
+'''
+Mind / Identify 的离线基准测试
+
+用法:
+    python -m <package>.bench stream --chunks 20000
+    python -m <package>.bench to_dict
+    python -m <package>.bench memory --turns 1000
+    python -m <package>.bench request --mode stream --tool-calls 2 --latency 0.05
+    python -m <package>.bench calls --calls 8 --work 0.01
+    python -m <package>.bench scale --tools 10 100 1000
+    python -m <package>.bench prefix --turns 200
+    python -m <package>.bench prefix --turns 50 --online --prefill-rate 20000
+    python -m <package>.bench --output bench.json all
+
+所有结果以 JSON 输出，request 套件在本地启动 mockserver.MockServer，不访问外部服务
+'''
+from typing             import Any, Callable, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from .identify          import _StreamBuffer, Identify, Mind, ContextWindow, to_dict_recursive, compact_message
+from .mockserver        import MockServer, common_prefix
+import tracemalloc
+import threading
+import argparse
+import platform
+import random
+import json
+import time
+
+
+class _Fields:
+    '''模拟 pydantic 模型：支持属性访问与 dict() / model_dump()'''
+    __slots__ = ('_fields',)
+
+    def __init__(self, **fields) -> None:
+        object.__setattr__(self, '_fields', fields)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def model_dump(self) -> dict:
+        return {k: to_dict_recursive(v) for k, v in self._fields.items()}
+
+    dict = model_dump
+
+
+def _make_delta(**fields):
+    '''优先使用 openai 的真实类型，未安装时退回到 _Fields'''
+    try:
+        from openai.types.chat.chat_completion_chunk import (
+            ChoiceDelta, ChoiceDeltaToolCall, ChoiceDeltaToolCallFunction
+        )
+    except ImportError:
+        tool_calls = fields.get('tool_calls')
+        if tool_calls:
+            fields['tool_calls'] = [
+                _Fields(index=tc['index'], id=tc['id'], type='function', function=_Fields(**tc['function']))
+                for tc in tool_calls
+            ]
+        return _Fields(**{'content': None, 'tool_calls': None, 'role': None, **fields})
+
+    tool_calls = fields.get('tool_calls')
+    if tool_calls:
+        fields['tool_calls'] = [
+            ChoiceDeltaToolCall(index=tc['index'], id=tc['id'], type='function',
+                                function=ChoiceDeltaToolCallFunction(**tc['function']))
+            for tc in tool_calls
+        ]
+    return ChoiceDelta(**fields)
+
+
+def synthetic_deltas(chunks: int=20000, tool_calls: int=4) -> list:
+    '''
+    生成合成的流式 delta 序列
+
+    前半部分为推理与正文 token，后半部分为多个工具调用的参数片段
+    '''
+    deltas = []
+    text_chunks = chunks // 2
+    for i in range(text_chunks):
+        if i % 2:
+            deltas.append(_make_delta(content=f'tok{i} '))
+        else:
+            deltas.append(_make_delta(reasoning_content=f'think{i} '))
+
+    per_call = max((chunks - text_chunks) // max(tool_calls, 1), 2)
+    for index in range(tool_calls):
+        deltas.append(_make_delta(tool_calls=[{
+            'index': index, 'id': f'call_{index}',
+            'function': {'name': f'tool_{index}', 'arguments': '{"q": "'}
+        }]))
+        for j in range(per_call - 2):
+            deltas.append(_make_delta(tool_calls=[{
+                'index': index, 'id': None,
+                'function': {'name': None, 'arguments': f'x{j}'}
+            }]))
+        deltas.append(_make_delta(tool_calls=[{
+            'index': index, 'id': None,
+            'function': {'name': None, 'arguments': '"}'}
+        }]))
+    return deltas
+
+
+def legacy_to_dict(obj: Any) -> Any:
+    '''原 to_dict_recursive 的实现：逐层 isinstance/hasattr 判断并总是复制容器'''
+    if isinstance(obj, dict):
+        return {k: legacy_to_dict(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        original_type = type(obj)
+        return original_type(legacy_to_dict(item) for item in obj)
+    elif hasattr(obj, 'dict') and callable(getattr(obj, 'dict')):
+        return legacy_to_dict(obj.dict())
+    else:
+        return obj
+
+
+def legacy_decode(deltas: list, reasoning: bool=True) -> tuple:
+    '''原 __request_stream 的解码方式：逐块完整转换为字典并使用字符串拼接'''
+    tool_calls = []
+    content = ''
+    events = 0
+    for delta in deltas:
+        delta = legacy_to_dict(delta)
+        if delta.get('reasoning_content') and reasoning == True:
+            events += 1
+        if delta.get('content'):
+            content += delta['content']
+            events += 1
+        if delta.get('tool_calls'):
+            for tcchunk in delta['tool_calls']:
+                if len(tool_calls) <= tcchunk['index']:
+                    tool_calls.append({'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}})
+                tc = tool_calls[tcchunk['index']]
+                if tcchunk['id']:
+                    tc['id'] += tcchunk['id']
+                if tcchunk['function']['name']:
+                    tc['function']['name'] += tcchunk['function']['name']
+                if tcchunk['function']['arguments']:
+                    tc['function']['arguments'] += tcchunk['function']['arguments']
+    return content, tool_calls, events
+
+
+def buffered_decode(deltas: list, reasoning: bool=True) -> tuple:
+    '''当前 __request_stream 的解码方式'''
+    buffer = _StreamBuffer(reasoning=reasoning)
+    events = 0
+    for delta in deltas:
+        events += len(buffer.feed(delta))
+    return buffer.text, buffer.tool_calls, events
+
+
+def _timeit(func: Callable, *args, repeat: int=5) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'best': samples[0],
+        'median': samples[len(samples) // 2],
+    }
+
+
+def bench_stream_decode(chunks: int=20000, tool_calls: int=4, repeat: int=5) -> dict:
+    '''对比原始解码与增量解码在合成流上的耗时'''
+    deltas = synthetic_deltas(chunks, tool_calls)
+    if legacy_decode(deltas) != buffered_decode(deltas):
+        raise AssertionError('两种解码方式的结果不一致')
+
+    legacy = _timeit(legacy_decode, deltas, repeat=repeat)
+    buffered = _timeit(buffered_decode, deltas, repeat=repeat)
+    return {
+        'name': 'stream_decode',
+        'chunks': len(deltas),
+        'legacy': legacy,
+        'buffered': buffered,
+        'speedup': legacy['median'] / buffered['median'],
+    }
+
+
+def to_dict_cases(turns: int=1000, calls: int=200, rows: int=20000) -> dict:
+    '''
+    生成 to_dict_recursive 的测试数据
+
+    - messages: 已是普通字典的多轮对话历史
+    - tool_calls: 模型对象形式的工具调用列表
+    - tool_result: 体积较大的工具返回结果
+    '''
+    messages = []
+    for i in range(turns):
+        messages.append({'role': 'user', 'content': f'question {i}'})
+        messages.append({
+            'role': 'assistant', 'content': f'answer {i}', 'refusal': None,
+            'tool_calls': [{'id': f'call_{i}', 'type': 'function',
+                            'function': {'name': 'lookup', 'arguments': '{"q": "x"}'}}],
+        })
+        messages.append({'role': 'tool', 'tool_call_id': f'call_{i}', 'name': 'lookup', 'content': 'ok'})
+
+    tool_calls = [
+        _Fields(id=f'call_{i}', type='function', index=i,
+                function=_Fields(name=f'tool_{i % 7}', arguments=json.dumps({'q': i, 'tags': ['a', 'b']})))
+        for i in range(calls)
+    ]
+
+    tool_result = {
+        'total': rows,
+        'rows': [{'id': i, 'name': f'row {i}', 'score': i / 3, 'tags': ['x', 'y'], 'extra': None}
+                 for i in range(rows)],
+    }
+    return {'messages': messages, 'tool_calls': tool_calls, 'tool_result': tool_result}
+
+
+def bench_to_dict(repeat: int=5, **sizes) -> dict:
+    '''对比原始实现与当前 to_dict_recursive 在各类数据上的耗时'''
+    results = []
+    for name, data in to_dict_cases(**sizes).items():
+        if legacy_to_dict(data) != to_dict_recursive(data):
+            raise AssertionError(f'{name}: 两种实现的结果不一致')
+        legacy = _timeit(legacy_to_dict, data, repeat=repeat)
+        current = _timeit(to_dict_recursive, data, repeat=repeat)
+        results.append({
+            'case': name,
+            'legacy': legacy,
+            'current': current,
+            'speedup': legacy['median'] / current['median'],
+        })
+    return {'name': 'to_dict', 'cases': results}
+
+
+def conversation_records(turns: int=1000) -> list:
+    '''
+    生成一段多轮对话的 JSON 文本，模拟从接口或 store 解码得到的消息
+
+    每轮为 用户消息、带一次工具调用的 assistant 完整输出、工具结果、最终的 assistant 完整输出
+    '''
+    records = []
+    for i in range(turns):
+        records.append({'role': 'user', 'content': f'question {i}'})
+        call = {'id': f'call_{i}', 'type': 'function', 'index': None,
+                'function': {'name': 'lookup', 'arguments': json.dumps({'q': i})}}
+        records.append({'role': 'assistant', 'content': '', 'refusal': None, 'audio': None,
+                        'function_call': None, 'annotations': None, 'reasoning_content': None,
+                        'tool_calls': [call]})
+        records.append({'role': 'tool', 'tool_call_id': f'call_{i}', 'name': 'lookup', 'content': 'ok'})
+        records.append({'role': 'assistant', 'content': f'answer {i}', 'refusal': None, 'audio': None,
+                        'function_call': None, 'annotations': None, 'reasoning_content': None,
+                        'tool_calls': None})
+    return [json.dumps(r) for r in records]
+
+
+def _allocated(build: Callable, *args) -> tuple:
+    tracemalloc.start()
+    try:
+        result = build(*args)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def bench_memory(turns: int=1000, sessions: int=10) -> dict:
+    '''对比完整字典与 compact_message 保存多个会话历史所占用的内存'''
+    records = conversation_records(turns)
+    decode = lambda: [[json.loads(r) for r in records] for _ in range(sessions)]
+    compact = lambda: [[compact_message(json.loads(r)) for r in records] for _ in range(sessions)]
+
+    message = json.loads(records[3])
+    if compact_message(message) != {k: v for k, v in message.items() if v is not None}:
+        raise AssertionError('压缩前后的消息内容不一致')
+
+    _, legacy = _allocated(decode)
+    _, current = _allocated(compact)
+    return {
+        'name': 'memory',
+        'turns': turns,
+        'sessions': sessions,
+        'messages': len(records),
+        'legacy_bytes': legacy // sessions,
+        'compact_bytes': current // sessions,
+        'saved_bytes_per_conversation': (legacy - current) // sessions,
+        'ratio': current / legacy,
+    }
+
+
+def synthetic_tools(idf: Identify, count: int, work: float=0.0) -> List[str]:
+    '''
+    向 idf 注册 count 个结构相同、名称与描述不同的工具
+
+    Args:
+        idf: 工具注册表
+        count: 工具数量
+        work: 每次调用阻塞的时间（秒），模拟 I/O
+
+    Returns:
+        list: 工具名称
+    '''
+    names = []
+    for i in range(count):
+        def tool(query: str, limit: int=10) -> str:
+            if work:
+                time.sleep(work)
+            return 'ok'
+        tool.__name__ = tool.__qualname__ = f'lookup_{i}'
+        tool.__doc__ = f'''
+        在第 {i} 号数据集中检索记录
+
+        Args:
+            query: 检索关键词
+            limit: 返回的最大条数
+        '''
+        idf.identify(tool)
+        names.append(tool.__name__)
+    return names
+
+
+def _summary(samples: List[float]) -> dict:
+    if not samples:
+        return {'count': 0}
+    samples = sorted(samples)
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)]
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': pick(0.5),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': samples[-1],
+    }
+
+
+def bench_request(mode: str='block', requests: int=200, concurrency: int=8, tools: int=4, **server) -> dict:
+    '''
+    在本地模拟服务上测量 Mind.request 的端到端吞吐与延迟
+
+    每个请求使用新的 Mind（共用 Identify 与 Mind.clients 中的连接池），
+    模拟服务返回工具调用时，一次请求包含调用工具与最终回答两轮
+
+    Args:
+        mode: block 或 stream
+        requests: 请求总数
+        concurrency: 同时进行的请求数
+        tools: 注册的工具数量
+        **server: MockServer 的参数，如 latency、token_rate、tool_calls、fragment、error_rate
+    '''
+    idf = Identify(max_workers=4)
+    synthetic_tools(idf, tools)
+    failures = []
+    lock = threading.Lock()
+
+    with MockServer(**server) as mock:
+        def one(i: int) -> tuple:
+            mind = Mind('mock', 'sk-mock', mock.url, identify=idf)
+            mind.add_content('user', f'question {i}')
+            started = time.perf_counter()
+            first = None
+            try:
+                if mode == 'stream':
+                    for _ in mind.request(stream=True):
+                        if first is None:
+                            first = time.perf_counter() - started
+                else:
+                    mind.request()
+            except Exception as e:
+                with lock:
+                    failures.append(type(e).__name__)
+                return None
+            return time.perf_counter() - started, first
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = [r for r in pool.map(one, range(requests)) if r is not None]
+        elapsed = time.perf_counter() - started
+        served, injected = mock.requests, mock.errors
+
+    idf.shutdown()
+    result = {
+        'name': 'request',
+        'mode': mode,
+        'requests': requests,
+        'concurrency': concurrency,
+        'tools': tools,
+        'server': server,
+        'elapsed': elapsed,
+        'throughput': len(results) / elapsed,
+        'failed': len(failures),
+        'failures': sorted(set(failures)),
+        'server_requests': served,
+        'server_errors': injected,
+        'latency': _summary([r[0] for r in results]),
+    }
+    if mode == 'stream':
+        result['ttft'] = _summary([r[1] for r in results if r[1] is not None])
+    return result
+
+
+def bench_calls(calls: int=8, workers: Iterable[int]=(1, 2, 4, 8), work: float=0.01, repeat: int=5) -> dict:
+    '''测量 Identify.calls 在不同线程池大小下执行一组 I/O 型工具调用的耗时'''
+    info = [
+        {'id': f'call_{i}', 'type': 'function',
+         'function': {'name': 'lookup_0', 'arguments': json.dumps({'query': f'q{i}'})}}
+        for i in range(calls)
+    ]
+    results = []
+    for count in workers:
+        idf = Identify(max_workers=count)
+        synthetic_tools(idf, 1, work)
+        timing = _timeit(idf.calls, info, repeat=repeat)
+        idf.shutdown()
+        results.append({'workers': count, **timing, 'calls_per_second': calls / timing['median']})
+    for item in results:
+        item['speedup'] = results[0]['median'] / item['median']
+    return {'name': 'calls', 'calls': calls, 'work': work, 'cases': results}
+
+
+def bench_scale(tools: Iterable[int]=(10, 100, 1000), history: Iterable[int]=(100, 1000, 10000),
+                repeat: int=5) -> dict:
+    '''
+    测量工具数量与历史长度增长时 req_info 与 build_memory 的耗时
+
+    - tools: 首次生成工具列表（cold）、读取缓存（warm）与单个工具（single）的 req_info
+    - history: 完整重建（cold）与追加一条消息后（append）的 build_memory
+    '''
+    tool_cases = []
+    for count in tools:
+        idf = Identify()
+        started = time.perf_counter()
+        names = synthetic_tools(idf, count)
+        registered = time.perf_counter() - started
+
+        def cold():
+            idf._invalidate()
+            idf.req_info(strict=True)
+
+        tool_cases.append({
+            'tools': count,
+            'register': registered,
+            'payload_bytes': len(idf.req_tools(strict=True).payload),
+            'cold': _timeit(cold, repeat=repeat),
+            'warm': _timeit(idf.req_info, None, True, repeat=repeat),
+            'single': _timeit(idf.req_info, names[-1], True, repeat=repeat),
+        })
+
+    history_cases = []
+    idf = Identify()
+    synthetic_tools(idf, 10)
+    for messages in history:
+        mind = Mind('mock', 'sk-mock', 'http://127.0.0.1:9/v1', identify=idf)
+        mind.add_predefined_prompt('system', 'You are a helpful assistant.')
+        mind.add_notice('system', 'Answer briefly.')
+        mind._remember(*(json.loads(r) for r in conversation_records(max(messages // 4, 1))))
+
+        def cold():
+            mind._view_state = None
+            mind.build_memory
+
+        def append():
+            mind.add_content('user', 'next question')
+            mind.build_memory
+
+        history_cases.append({
+            'messages': len(mind._memories),
+            'cold': _timeit(cold, repeat=repeat),
+            'append': _timeit(append, repeat=repeat),
+        })
+    return {'name': 'scale', 'tools': tool_cases, 'history': history_cases}
+
+
+def bench_prefix(turns: int=200, tools: int=20, budget: int=8000, reload: int=10,
+                 online: bool=False, seed: int=0, **server) -> dict:
+    '''
+    比较默认布局与 Mind.prefix_stable 布局下供应商提示词缓存的命中情况
+
+    模拟一段长对话：每轮更新一条带轮次的通知，每 reload 轮以随机顺序重新注册全部工具（如 MCP 重新加载），
+    历史超过 budget 后由 ContextWindow 裁剪。
+
+    - 离线模式：以相邻两次请求的工具列表与消息 JSON 的公共前缀计算命中率
+    - online: 在 MockServer(prompt_cache=...) 上实际请求，记录每轮的 cached_tokens 与耗时
+    '''
+    names = [f'lookup_{i}' for i in range(tools)]
+    layouts = []
+    for stable in (False, True):
+        shuffle = random.Random(seed)
+        mock = MockServer(**{'prompt_cache': 8, **server}).start() if online else None
+        try:
+            mind = Mind('mock', 'sk-mock', mock.url if mock else 'http://127.0.0.1:9/v1')
+            mind.prefix_stable = stable
+            mind.context_window = ContextWindow(default_budget=budget, reserve=0)
+            mind.add_predefined_prompt('system', 'You are a helpful assistant.\r\nFollow the rules.  \r\n')
+
+            previous = None
+            shared = total = cached = prompt_tokens = 0
+            latencies = []
+            for turn in range(turns):
+                if turn % reload == 0:
+                    idf = Identify()
+                    synthetic_tools(idf, tools)
+                    order = names[:]
+                    shuffle.shuffle(order)
+                    idf._functions = {name: idf._functions[name] for name in order}
+                    idf._invalidate()
+                    mind.idf = idf
+                mind.reset_notice([('system', f'当前是第 {turn} 轮对话')])
+                mind.add_content('user', f'question {turn} ' * 20)
+                if mock is None:
+                    args = mind._completion_args(0, {})
+                    prompt = json.dumps([args.get('tools'), args['messages']], ensure_ascii=False)
+                    if previous is not None:
+                        shared += common_prefix(prompt, previous)
+                        total += len(prompt)
+                    previous = prompt
+                    mind.add_content('assistant', f'answer {turn} ' * 40)
+                else:
+                    started = time.perf_counter()
+                    result = mind.request()
+                    latencies.append(time.perf_counter() - started)
+                    for info in result['rounds']:
+                        cached += info.get('cached_tokens') or 0
+                        prompt_tokens += (info.get('usage') or {}).get('prompt_tokens') or 0
+        finally:
+            if mock is not None:
+                mock.stop()
+
+        layout = {'layout': 'stable' if stable else 'default', 'messages': len(mind._memories)}
+        if mock is None:
+            layout['shared_prefix_ratio'] = shared / total if total else 0.0
+        else:
+            layout['cached_ratio'] = cached / prompt_tokens if prompt_tokens else 0.0
+            layout['latency'] = _summary(latencies)
+        layouts.append(layout)
+    return {'name': 'prefix', 'turns': turns, 'tools': tools, 'budget': budget, 'online': online,
+            'server': server, 'layouts': layouts}
+
+
+def _server_options(args: argparse.Namespace) -> dict:
+    return {
+        'latency': args.latency,
+        'token_rate': args.token_rate,
+        'tokens': args.tokens,
+        'tool_calls': args.tool_calls,
+        'fragment': args.fragment,
+        'error_rate': args.error_rate,
+        'seed': args.seed,
+    }
+
+
+
+def main(argv: list=None) -> None:
+    parser = argparse.ArgumentParser(description='Mind / Identify 基准测试')
+    parser.add_argument('--output', help='同时将结果写入该 JSON 文件')
+    sub = parser.add_subparsers(dest='suite', required=True)
+
+    stream = sub.add_parser('stream', help='流式 delta 解码')
+    stream.add_argument('--chunks', type=int, default=20000)
+    stream.add_argument('--tool-calls', type=int, default=4)
+    stream.add_argument('--repeat', type=int, default=5)
+
+    to_dict = sub.add_parser('to_dict', help='to_dict_recursive 转换')
+    to_dict.add_argument('--turns', type=int, default=1000)
+    to_dict.add_argument('--calls', type=int, default=200)
+    to_dict.add_argument('--rows', type=int, default=20000)
+    to_dict.add_argument('--repeat', type=int, default=5)
+
+    memory = sub.add_parser('memory', help='Mind._memories 的内存占用')
+    memory.add_argument('--turns', type=int, default=1000)
+    memory.add_argument('--sessions', type=int, default=10)
+
+    request = sub.add_parser('request', help='Mind.request 端到端吞吐与延迟（本地模拟服务）')
+    request.add_argument('--mode', choices=('block', 'stream', 'both'), default='both')
+    request.add_argument('--requests', type=int, default=200)
+    request.add_argument('--concurrency', type=int, default=8)
+    request.add_argument('--tools', type=int, default=4)
+    request.add_argument('--latency', type=float, default=0.0)
+    request.add_argument('--token-rate', type=float, default=0)
+    request.add_argument('--tokens', type=int, default=32)
+    request.add_argument('--tool-calls', type=int, default=2)
+    request.add_argument('--fragment', type=int, default=8)
+    request.add_argument('--error-rate', type=float, default=0.0)
+    request.add_argument('--seed', type=int, default=0)
+
+    calls = sub.add_parser('calls', help='Identify.calls 的工具并发')
+    calls.add_argument('--calls', type=int, default=8)
+    calls.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    calls.add_argument('--work', type=float, default=0.01)
+    calls.add_argument('--repeat', type=int, default=5)
+
+    scale = sub.add_parser('scale', help='req_info 与 build_memory 随工具数量与历史长度的变化')
+    scale.add_argument('--tools', type=int, nargs='+', default=[10, 100, 1000])
+    scale.add_argument('--history', type=int, nargs='+', default=[100, 1000, 10000])
+    scale.add_argument('--repeat', type=int, default=5)
+
+    prefix = sub.add_parser('prefix', help='默认布局与 prefix_stable 布局的提示词缓存命中')
+    prefix.add_argument('--turns', type=int, default=200)
+    prefix.add_argument('--tools', type=int, default=20)
+    prefix.add_argument('--budget', type=int, default=8000)
+    prefix.add_argument('--reload', type=int, default=10)
+    prefix.add_argument('--online', action='store_true', help='在本地模拟服务上实际请求')
+    prefix.add_argument('--latency', type=float, default=0.0)
+    prefix.add_argument('--prefill-rate', type=float, default=20000)
+    prefix.add_argument('--seed', type=int, default=0)
+
+    sub.add_parser('all', help='以默认参数运行全部套件')
+
+    args = parser.parse_args(argv)
+    if args.suite == 'stream':
+        result = bench_stream_decode(args.chunks, args.tool_calls, args.repeat)
+    elif args.suite == 'to_dict':
+        result = bench_to_dict(args.repeat, turns=args.turns, calls=args.calls, rows=args.rows)
+    elif args.suite == 'memory':
+        result = bench_memory(args.turns, args.sessions)
+    elif args.suite == 'request':
+        modes = ('block', 'stream') if args.mode == 'both' else (args.mode,)
+        result = [
+            bench_request(mode, args.requests, args.concurrency, args.tools, **_server_options(args))
+            for mode in modes
+        ]
+        result = result[0] if len(result) == 1 else {'name': 'request', 'modes': result}
+    elif args.suite == 'calls':
+        result = bench_calls(args.calls, args.workers, args.work, args.repeat)
+    elif args.suite == 'scale':
+        result = bench_scale(args.tools, args.history, args.repeat)
+    elif args.suite == 'prefix':
+        server = {'latency': args.latency, 'prefill_rate': args.prefill_rate} if args.online else {}
+        result = bench_prefix(args.turns, args.tools, args.budget, args.reload, args.online, args.seed, **server)
+    elif args.suite == 'all':
+        result = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started': time.time(),
+            'results': [
+                bench_stream_decode(),
+                bench_to_dict(),
+                bench_memory(),
+                bench_request('block', tool_calls=2),
+                bench_request('stream', tool_calls=2),
+                bench_calls(),
+                bench_scale(),
+                bench_prefix(),
+            ],
+        }
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
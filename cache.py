@@ -0,0 +1,244 @@
+from typing      import Any, Callable, Dict, Tuple
+from collections import OrderedDict
+import threading
+import hashlib
+import inspect
+import json
+import time
+import os
+
+
+class Replay:
+    '''
+    以属性方式访问缓存中的响应数据，模拟 openai 返回的对象
+
+    不存在的字段返回None，model_dump 返回原始字典
+    '''
+    __slots__ = ('_data',)
+
+    def __init__(self, data: Dict) -> None:
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = self._data.get(name)
+        if isinstance(value, dict):
+            return Replay(value)
+        if isinstance(value, list):
+            return [Replay(v) if isinstance(v, dict) else v for v in value]
+        return value
+
+    def model_dump(self, **kwargs) -> Dict:
+        return self._data
+
+
+class ResponseCache:
+    '''
+    模型响应的磁盘缓存
+
+    以请求参数的稳定哈希为键，每个响应保存为一个 JSON 文件；
+    按最近使用顺序淘汰，保证总大小与条目数不超过上限
+    '''
+    def __init__(self, directory: str, max_bytes: int=256 * 1024 * 1024, max_entries: int=None) -> None:
+        '''
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存文件的总大小上限
+            max_entries: 缓存条目数上限，为None时不限制
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # 按文件访问时间恢复最近使用顺序
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+
+    @staticmethod
+    def key(args: Dict, tools: bytes=b'') -> str:
+        '''
+        生成请求的缓存键
+
+        Args:
+            args: 传给 chat.completions.create 的参数（不含 tools）
+            tools: 序列化后的工具列表
+        '''
+        digest = hashlib.sha256()
+        digest.update(json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(tools)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Dict:
+        '''读取缓存，不存在时返回None'''
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                record = json.load(f)
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            with self._lock:
+                self._size -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return record
+
+    def put(self, key: str, record: Dict) -> None:
+        '''写入缓存，必要时淘汰最久未使用的条目'''
+        data = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        temp = self._path(key) + f'.{threading.get_ident()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, self._path(key))
+
+        with self._lock:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            evicted = []
+            while self._index and (self._size > self.max_bytes or
+                                   (self.max_entries is not None and len(self._index) > self.max_entries)):
+                old, size = self._index.popitem(last=False)
+                self._size -= size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def replay(self, record: Dict) -> Any:
+        '''将缓存记录还原为响应对象，流式记录还原为逐块的迭代器'''
+        if record.get('stream'):
+            return [Replay(chunk) for chunk in record['chunks']]
+        return Replay(record['response'])
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._index)
+            self._index.clear()
+            self._size = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._index),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class CachePolicy:
+    '''
+    工具调用结果的缓存策略
+
+    以规范化的 JSON 参数为键缓存函数返回值，命中时不再调用函数；
+    调用抛出异常时不缓存
+    '''
+    def __init__(self, ttl: float=None, max_entries: int=1024, key: Callable[..., str]=None) -> None:
+        '''
+        Args:
+            ttl: 缓存有效期（秒），为None时不过期
+            max_entries: 每个工具最多缓存的条目数，超出时淘汰最久未使用的条目
+            key: 自定义缓存键函数，接收与工具相同的参数并返回字符串，为None时使用规范化的 JSON 参数
+        '''
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key = key
+
+
+class ToolCache:
+    '''按 CachePolicy 缓存单个工具的调用结果'''
+    # get 未命中时的返回值，用于区分缓存的None
+    MISS = object()
+
+    def __init__(self, policy: CachePolicy, func: Callable=None) -> None:
+        '''
+        Args:
+            policy: 缓存策略
+            func: 被缓存的函数，用于在生成缓存键前补全参数默认值
+        '''
+        self.policy = policy
+        try:
+            self._signature = inspect.signature(func) if func is not None else None
+        except (TypeError, ValueError):
+            self._signature = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def key(self, args: tuple, kwargs: Dict) -> str:
+        '''生成缓存键，等价的参数（顺序不同、省略默认值）得到相同的键'''
+        if self.policy.key is not None:
+            return self.policy.key(*args, **kwargs)
+        if self._signature is not None:
+            try:
+                bound = self._signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                args, kwargs = (), bound.arguments
+            except TypeError:
+                pass
+        return json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+    def get(self, key: str) -> Any:
+        '''读取缓存，未命中或已过期时返回 ToolCache.MISS'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return self.MISS
+
+    def put(self, key: str, value: Any) -> None:
+        ttl = self.policy.ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.policy.max_entries, 1):
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
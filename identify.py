@@ -1,11 +1,30 @@
 from typing      import Any, Callable, Union, List, Tuple, Dict
 from dataclasses import dataclass, field
 from .mcp        import MCPClient
+from .store      import MemoryStore
+from .cache      import ResponseCache, CachePolicy, ToolCache
+from .metrics    import Metrics, metrics as default_metrics
+from .router     import ToolRouter
 from dlso        import req_file
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+import unicodedata
+import weakref
+import dataclasses
+import threading
+import hashlib
+import asyncio
+import typing
+import queue
+import types
 import inspect
+import copy
+import sys
 import re
 import os
 import json
+import time
+import openai
+import httpx
 
 
 @dataclass
@@ -13,14 +32,636 @@ class Endpoint:
     model:str    = field(default='')
     key:str      = field(default='')
     endpoint:str = field(default='')
+    weight:int   = field(default=1)
+
+
+class _EndpointState:
+    __slots__ = ('outstanding', 'latency', 'failures', 'open_until', 'requests', 'errors', 'current')
+
+    def __init__(self) -> None:
+        self.outstanding = 0        # 进行中的请求数
+        self.latency: float = None  # 最近延迟的指数移动平均（秒）
+        self.failures = 0           # 连续失败次数
+        self.open_until = 0.0       # 熔断结束时间
+        self.requests = 0
+        self.errors = 0
+        self.current = 0            # 平滑加权轮询的当前权重
+
+
+class EndpointPool:
+    '''
+    多端点负载均衡与故障转移
+
+    按策略选择端点：
+        round_robin: 平滑加权轮询，按 Endpoint.weight 分配流量
+        least_outstanding: 进行中请求数最少的端点优先
+        latency: 最近延迟（指数移动平均）最低的端点优先
+    端点连续出现 429/5xx/连接错误达到阈值后熔断一段时间，期间只在其他端点都不可用时才会被尝试
+    '''
+    POLICIES = ('round_robin', 'least_outstanding', 'latency')
+
+    def __init__(self,
+                 endpoints: List[Endpoint],
+                 policy: str='round_robin',
+                 failure_threshold: int=3,
+                 cooldown: float=30.0,
+                 latency_decay: float=0.3,
+                 max_attempts: int=None) -> None:
+        '''
+        Args:
+            endpoints: 端点列表
+            policy: 选择策略，见 POLICIES
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断持续时间（秒）
+            latency_decay: 延迟移动平均中最新样本的权重
+            max_attempts: 单次请求最多尝试的端点数，为None时尝试全部端点
+        '''
+        if not endpoints:
+            raise ValueError("端点列表不能为空")
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的负载均衡策略 '{policy}'")
+        self.endpoints: List[Endpoint] = list(endpoints)
+        self.policy = policy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_decay = latency_decay
+        self.max_attempts = max_attempts or len(self.endpoints)
+        self._states = [_EndpointState() for _ in self.endpoints]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        '''判断错误是否应熔断并转移到其他端点：限流、服务端错误与连接错误'''
+        if isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+            return True
+        status = getattr(error, 'status_code', None)
+        return isinstance(status, int) and (status == 429 or status >= 500)
+
+    def order(self) -> List[int]:
+        '''返回本次请求尝试端点的顺序（下标），熔断中的端点排在最后'''
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i, st in enumerate(self._states) if st.open_until <= now]
+            broken = sorted(
+                (i for i, st in enumerate(self._states) if st.open_until > now),
+                key=lambda i: self._states[i].open_until
+            )
+            if self.policy == 'round_robin' and healthy:
+                total = 0
+                for i in healthy:
+                    self._states[i].current += self.endpoints[i].weight
+                    total += self.endpoints[i].weight
+                first = max(healthy, key=lambda i: self._states[i].current)
+                self._states[first].current -= total
+                healthy.remove(first)
+                healthy.sort(key=lambda i: -self._states[i].current)
+                healthy.insert(0, first)
+            elif self.policy == 'least_outstanding':
+                healthy.sort(key=lambda i: (self._states[i].outstanding / max(self.endpoints[i].weight, 1),
+                                            self._states[i].latency or 0.0))
+            elif self.policy == 'latency':
+                # 尚无延迟数据的端点优先，以便获得样本
+                healthy.sort(key=lambda i: (self._states[i].latency is not None, self._states[i].latency or 0.0))
+        return (healthy + broken)[:self.max_attempts]
+
+    def acquire(self, index: int) -> None:
+        with self._lock:
+            self._states[index].outstanding += 1
+            self._states[index].requests += 1
+
+    def release(self, index: int, latency: float=None, error: BaseException=None) -> None:
+        '''
+        请求结束时调用
+
+        Args:
+            index: 端点下标
+            latency: 请求延迟（秒），失败时为None
+            error: 请求失败时的异常，只有可重试的错误计入熔断
+        '''
+        with self._lock:
+            st = self._states[index]
+            st.outstanding -= 1
+            if error is not None:
+                st.errors += 1
+                if self.is_retryable(error):
+                    st.failures += 1
+                    if st.failures >= self.failure_threshold:
+                        st.open_until = time.monotonic() + self.cooldown
+                return
+            st.failures = 0
+            st.open_until = 0.0
+            if latency is not None:
+                if st.latency is None:
+                    st.latency = latency
+                else:
+                    st.latency += self.latency_decay * (latency - st.latency)
+
+    def abandon(self, index: int) -> None:
+        '''请求被取消时调用，只归还占用，不计入熔断与延迟统计'''
+        with self._lock:
+            self._states[index].outstanding -= 1
+
+    @property
+    def health(self) -> List[Dict[str, Any]]:
+        '''各端点的健康状态'''
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    'model': ep.model,
+                    'endpoint': ep.endpoint,
+                    'healthy': st.open_until <= now,
+                    'outstanding': st.outstanding,
+                    'latency': st.latency,
+                    'failures': st.failures,
+                    'requests': st.requests,
+                    'errors': st.errors,
+                }
+                for ep, st in zip(self.endpoints, self._states)
+            ]
+
+
+class _PooledStream:
+    '''
+    EndpointPool 分配的流式响应
+
+    以首个数据块的到达时间作为延迟，读取结束、出错或被关闭时释放端点
+    '''
+    def __init__(self, pool: EndpointPool, index: int, started: float, response: Any) -> None:
+        self.pool = pool
+        self.index = index
+        self.started = started
+        self.response = response
+        self._released = False
+
+    def _release(self, latency: float=None, error: BaseException=None) -> None:
+        if not self._released:
+            self._released = True
+            self.pool.release(self.index, latency=latency, error=error)
+
+    def __iter__(self):
+        latency = None
+        error = None
+        try:
+            for chunk in self.response:
+                if latency is None:
+                    latency = time.perf_counter() - self.started
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # 调用方提前停止读取时同样释放端点
+            self._release(None if error else latency, error)
+
+    def close(self) -> None:
+        close = getattr(self.response, 'close', None)
+        if close:
+            close()
+        self._release()
+
+
+class _APooledStream(_PooledStream):
+    '''_PooledStream 的异步版本'''
+    async def __aiter__(self):
+        latency = None
+        error = None
+        try:
+            async for chunk in self.response:
+                if latency is None:
+                    latency = time.perf_counter() - self.started
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(None if error else latency, error)
+
+    async def close(self) -> None:
+        close = getattr(self.response, 'close', None)
+        if close:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        self._release()
+
+
+# 对冲请求中表示某个流已结束的标记
+_END = object()
+
+
+def _has_output(chunk: Any) -> bool:
+    '''数据块是否包含正文、推理内容或工具调用'''
+    choices = chunk.choices
+    if not choices:
+        return False
+    delta = choices[0].delta
+    if not delta:
+        return False
+    return bool(delta.content or getattr(delta, 'reasoning_content', None) or delta.tool_calls)
+
+
+class _HedgedStream:
+    '''
+    带首 token 超时的对冲流式请求
+
+    主请求在 ttft 秒内没有产生输出（或在产生输出前失败）时，再发起一个相同的请求；
+    先产生输出的流胜出，另一个流被关闭。胜出前收到的空数据块（如只含 role 的块）会被保留并一并输出
+    '''
+    def __init__(self, opener: Callable[[], Any], ttft: float, stats: dict=None) -> None:
+        '''
+        Args:
+            opener: 发起一次流式请求并返回可迭代响应的函数
+            ttft: 首 token 超时时间（秒）
+            stats: 记录对冲次数的字典，包含 fired 与 won 两个计数
+        '''
+        self.opener = opener
+        self.ttft = ttft
+        self.stats = stats if stats is not None else {'fired': 0, 'won': 0}
+
+    def __iter__(self):
+        results = queue.Queue()
+        streams = {}
+        cancelled = set()
+
+        def close(tag):
+            cancelled.add(tag)
+            stream = streams.get(tag)
+            if stream is not None and hasattr(stream, 'close'):
+                try:
+                    stream.close()
+                except Exception: pass
+
+        def pump(tag):
+            try:
+                stream = self.opener()
+                streams[tag] = stream
+                if tag in cancelled:
+                    close(tag)
+                    return
+                for chunk in stream:
+                    if tag in cancelled:
+                        return
+                    results.put((tag, chunk))
+            except Exception as e:
+                results.put((tag, e))
+                return
+            results.put((tag, _END))
+
+        def start(tag):
+            buffers[tag] = []
+            threading.Thread(target=pump, args=(tag,), daemon=True, name=f'hedge-{tag}').start()
+
+        buffers: dict[int, list] = {}
+        failed = set()
+        winner = None
+        start(0)
+        deadline = time.monotonic() + self.ttft
+        try:
+            while True:
+                timeout = None if winner is not None or len(buffers) > 1 else max(deadline - time.monotonic(), 0)
+                try:
+                    tag, item = results.get(timeout=timeout)
+                except queue.Empty:
+                    self.stats['fired'] += 1
+                    start(1)
+                    continue
+
+                if winner is None:
+                    if isinstance(item, Exception):
+                        failed.add(tag)
+                        if len(buffers) == 1:
+                            # 主请求在产生输出前失败，立即发起对冲请求
+                            self.stats['fired'] += 1
+                            start(1)
+                        elif len(failed) == len(buffers):
+                            raise item
+                        continue
+                    if item is not _END and not _has_output(item):
+                        buffers[tag].append(item)
+                        continue
+                    winner = tag
+                    if tag != 0:
+                        self.stats['won'] += 1
+                    for other in buffers:
+                        if other != tag:
+                            close(other)
+                    yield from buffers.pop(tag)
+                    if item is _END:
+                        return
+                    yield item
+                    continue
+
+                if tag != winner:
+                    continue
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 包括调用方提前停止读取时仍在进行的胜出流
+            for tag in list(buffers) + list(streams):
+                close(tag)
+
+
+async def _ahedged_stream(opener: Callable[[], Any], ttft: float, stats: dict):
+    '''_HedgedStream 的异步版本，opener 为返回异步可迭代响应的协程函数'''
+    results = asyncio.Queue()
+    tasks: dict[int, asyncio.Task] = {}
+    buffers: dict[int, list] = {}
+
+    async def pump(tag):
+        stream = None
+        try:
+            stream = await opener()
+            async for chunk in stream:
+                await results.put((tag, chunk))
+        except asyncio.CancelledError:
+            close = getattr(stream, 'close', None)
+            if close:
+                try:
+                    result = close()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception: pass
+            raise
+        except Exception as e:
+            await results.put((tag, e))
+            return
+        await results.put((tag, _END))
+
+    def start(tag):
+        buffers[tag] = []
+        tasks[tag] = asyncio.ensure_future(pump(tag))
+
+    failed = set()
+    winner = None
+    start(0)
+    deadline = time.monotonic() + ttft
+    try:
+        while True:
+            timeout = None if winner is not None or len(buffers) > 1 else max(deadline - time.monotonic(), 0)
+            try:
+                tag, item = await asyncio.wait_for(results.get(), timeout)
+            except asyncio.TimeoutError:
+                stats['fired'] += 1
+                start(1)
+                continue
+
+            if winner is None:
+                if isinstance(item, Exception):
+                    failed.add(tag)
+                    if len(buffers) == 1:
+                        stats['fired'] += 1
+                        start(1)
+                    elif len(failed) == len(buffers):
+                        raise item
+                    continue
+                if item is not _END and not _has_output(item):
+                    buffers[tag].append(item)
+                    continue
+                winner = tag
+                if tag != 0:
+                    stats['won'] += 1
+                for other, task in tasks.items():
+                    if other != tag:
+                        task.cancel()
+                for chunk in buffers.pop(tag):
+                    yield chunk
+                if item is _END:
+                    return
+                yield item
+                continue
+
+            if tag != winner:
+                continue
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+
+class ClientRegistry:
+    '''
+    进程内共享的 openai 客户端注册表
+
+    以 (端点, 密钥) 为键缓存客户端，所有 Mind 共用同一组 HTTP 连接池；
+    切换回已使用过的端点时直接复用已建立的连接。
+    异步客户端的连接绑定在创建它的事件循环上，因此按事件循环分别缓存，事件循环被回收后随之释放
+    '''
+    def __init__(self,
+                 max_connections: int=100,
+                 max_keepalive_connections: int=20,
+                 keepalive_expiry: float=30.0,
+                 http2: bool=False,
+                 timeout: float=600.0) -> None:
+        '''
+        Args:
+            max_connections: 每个客户端的最大连接数
+            max_keepalive_connections: 每个客户端保持的空闲连接数
+            keepalive_expiry: 空闲连接的保持时间（秒）
+            http2: 是否启用 HTTP/2（需要安装 h2）
+            timeout: 请求超时时间（秒）
+        '''
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+        self._clients: dict[tuple, Any] = {}
+        self._loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def configure(self, **options) -> None:
+        '''
+        修改连接池参数，参数名与构造函数相同
+
+        只影响之后新建的客户端，已有客户端需先 close 才会按新参数重建
+        '''
+        for name, value in options.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise ValueError(f"未知的连接池参数 '{name}'")
+            setattr(self, name, value)
+    
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections           = self.max_connections,
+            max_keepalive_connections = self.max_keepalive_connections,
+            keepalive_expiry          = self.keepalive_expiry,
+        )
+    
+    def get(self, key: str, endpoint: str, asynchronous: bool=False):
+        '''
+        获取端点对应的客户端，不存在时创建
+
+        Args:
+            key: API 密钥
+            endpoint: API 地址
+            asynchronous: 是否获取 openai.AsyncOpenAI 客户端，在事件循环中调用时返回该循环专用的客户端
+        '''
+        clients = self._clients
+        if asynchronous:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                clients = self._loops.get(loop)
+                if clients is None:
+                    with self._lock:
+                        clients = self._loops.setdefault(loop, {})
+        ident = (asynchronous, endpoint, key)
+        client = clients.get(ident)
+        if client is not None:
+            return client
+        with self._lock:
+            client = clients.get(ident)
+            if client is None:
+                if asynchronous:
+                    http_client = httpx.AsyncClient(limits=self._limits(), http2=self.http2, timeout=self.timeout)
+                    client = openai.AsyncOpenAI(api_key=key, base_url=endpoint, http_client=http_client)
+                else:
+                    http_client = httpx.Client(limits=self._limits(), http2=self.http2, timeout=self.timeout)
+                    client = openai.OpenAI(api_key=key, base_url=endpoint, http_client=http_client)
+                clients[ident] = client
+        return client
+    
+    def close(self) -> None:
+        '''关闭所有同步客户端并清空注册表，异步客户端需使用 aclose'''
+        with self._lock:
+            clients = [(ident, c) for ident, c in self._clients.items() if not ident[0]]
+            for ident, _ in clients:
+                self._clients.pop(ident)
+        for _, client in clients:
+            client.close()
+    
+    async def aclose(self) -> None:
+        '''关闭当前事件循环的异步客户端，以及在事件循环之外创建的异步客户端'''
+        with self._lock:
+            clients = [(ident, c) for ident, c in self._clients.items() if ident[0]]
+            for ident, _ in clients:
+                self._clients.pop(ident)
+            clients.extend(self._loops.pop(asyncio.get_running_loop(), {}).items())
+        for _, client in clients:
+            await client.close()
+    
+    def __len__(self) -> int:
+        return len(self._clients) + sum(len(clients) for clients in list(self._loops.values()))
+
+
+# 默认的全局客户端注册表
+client_registry = ClientRegistry()
+
+
+@dataclass(frozen=True)
+class ToolSchema:
+    '''
+    预编译的工具列表，由 Identify.req_tools 生成并缓存
+
+    Attributes:
+        version: 生成时 Identify 的版本号
+        strict: 是否为严格模式
+        tools: 可直接传给 tools 参数的工具列表（只读，请勿修改其中的字典）
+        payload: tools 列表序列化后的 JSON 字节串，可直接拼入请求体
+    '''
+    version: int
+    strict: bool
+    tools: Tuple[dict, ...]
+    payload: bytes = field(repr=False)
+
+
+def _plain(obj: Any) -> Any:
+    return obj
+
+
+def _convert_dict(obj: dict) -> dict:
+    # 仅在某个值需要转换时才复制，已是普通 JSON 的子树原样返回
+    result = None
+    for key, value in obj.items():
+        new = _CONVERTERS.get(type(value)) or _resolve_converter(type(value))
+        new = new(value)
+        if new is not value:
+            if result is None:
+                result = dict(obj)
+            result[key] = new
+    return obj if result is None else result
+
+
+def _convert_list(obj: list) -> list:
+    result = None
+    for index, value in enumerate(obj):
+        new = _CONVERTERS.get(type(value)) or _resolve_converter(type(value))
+        new = new(value)
+        if new is not value:
+            if result is None:
+                result = list(obj)
+            result[index] = new
+    return obj if result is None else result
+
+
+def _convert_tuple(obj: tuple) -> tuple:
+    items = _convert_list(list(obj))
+    if all(new is old for new, old in zip(items, obj)):
+        return obj
+    return type(obj)(items) if type(obj) is tuple else type(obj)(*items)
+
+
+def _convert_model(obj: Any) -> Any:
+    try:
+        # pydantic v2 使用 model_dump，v1 及其他对象退回到 .dict()
+        dump = getattr(obj, 'model_dump', None)
+        dict_repr = dump() if callable(dump) else obj.dict()
+    except Exception as e:
+        # 如果调用出错，可以选择记录日志或返回原始对象
+        print(f"警告：在 {type(obj)} 上调用 .dict() 时出错: {e}")
+        return obj # 或者根据需要引发错误: raise
+    # 对返回的结果再次转换，以处理其内部可能包含的需要转换的嵌套对象
+    return to_dict_recursive(dict_repr)
+
+
+# 按精确类型分派的转换表，未知类型在首次遇到时解析并缓存
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {
+    dict: _convert_dict,
+    list: _convert_list,
+    tuple: _convert_tuple,
+    str: _plain,
+    int: _plain,
+    float: _plain,
+    bool: _plain,
+    type(None): _plain,
+    bytes: _plain,
+}
+
+
+def _resolve_converter(cls: type) -> Callable[[Any], Any]:
+    if callable(getattr(cls, 'model_dump', None)) or callable(getattr(cls, 'dict', None)):
+        converter = _convert_model
+    elif issubclass(cls, dict):
+        converter = _convert_dict
+    elif issubclass(cls, list):
+        converter = _convert_list
+    elif issubclass(cls, tuple):
+        converter = _convert_tuple
+    else:
+        converter = _plain
+    _CONVERTERS[cls] = converter
+    return converter
 
 
 def to_dict_recursive(obj: Any) -> Union[Dict, List, Tuple, Any]:
     """
-    递归地将对象转换为字典（如果对象支持 .dict() 方法）。
+    递归地将对象转换为字典（如果对象支持 .model_dump() 或 .dict() 方法）。
     同时处理嵌套的字典、列表和元组。
     基本类型（int, float, str, bool, None）将保持不变。
 
+    按对象的精确类型查表分派；已经是普通 JSON 值的字典、列表子树不会被复制，
+    而是原样返回，因此调用方不应修改返回值中未经转换的部分。
+
     Args:
         obj: 要转换的对象。
 
@@ -28,39 +669,422 @@ def to_dict_recursive(obj: Any) -> Union[Dict, List, Tuple, Any]:
         对象的字典表示形式，或者如果它是基本类型或不支持 .dict() 方法
         （并且不是 dict、list 或 tuple），则返回原始对象。
     """
-    # 1. 处理字典：递归转换其值
-    if isinstance(obj, dict):
-        return {k: to_dict_recursive(v) for k, v in obj.items()}
-
-    # 2. 处理列表和元组：递归转换其元素，并保持原始类型
-    elif isinstance(obj, (list, tuple)):
-        original_type = type(obj)
-        return original_type(to_dict_recursive(item) for item in obj)
-
-    # 3. 处理具有 .dict() 方法的对象
-    #    使用 getattr 获取属性，并检查它是否可调用 (callable)
-    elif hasattr(obj, 'dict') and callable(getattr(obj, 'dict')):
-        try:
-            # 调用对象的 .dict() 方法获取其字典表示
-            dict_repr = obj.dict()
-            # 重要：对 .dict() 返回的结果再次调用 to_dict_recursive
-            # 以处理其内部可能包含的需要转换的嵌套对象/列表/字典
-            return to_dict_recursive(dict_repr)
-        except Exception as e:
-            # 如果调用 .dict() 出错，可以选择记录日志或返回原始对象
-            print(f"警告：在 {type(obj)} 上调用 .dict() 时出错: {e}")
-            return obj # 或者根据需要引发错误: raise
+    converter = _CONVERTERS.get(type(obj)) or _resolve_converter(type(obj))
+    return converter(obj)
+
+
+# 会被省略的空值；content 总是保留，部分接口要求 assistant 消息带有 content 字段
+_EMPTY = (None, [], {})
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
 
-    # 4. 处理基本类型或不支持 .dict() 的其他对象：直接返回
+
+def compact_message(message: dict) -> dict:
+    '''
+    生成消息的紧凑副本，用于保存在 Mind._memories 中
+
+    去掉值为None或空容器的字段（如 audio、function_call、refusal），
+    并驻留 role、工具名等在会话间大量重复的短字符串
+
+    Args:
+        message: OpenAI 格式的消息
+
+    Returns:
+        dict: 与原消息等价的新字典
+    '''
+    compact = {}
+    for key, value in message.items():
+        if key != 'content' and value in _EMPTY:
+            continue
+        if key == 'role' or key == 'name':
+            value = _intern(value)
+        elif key == 'tool_calls':
+            value = [_compact_tool_call(call) for call in value]
+        compact[key] = value
+    return compact
+
+
+def _compact_tool_call(call: dict) -> dict:
+    compact = {k: v for k, v in call.items() if v is not None}
+    if 'type' in compact:
+        compact['type'] = _intern(compact['type'])
+    function = compact.get('function')
+    if isinstance(function, dict):
+        function = {k: v for k, v in function.items() if v is not None}
+        if 'name' in function:
+            function['name'] = _intern(function['name'])
+        compact['function'] = function
+    return compact
+
+
+# JSON 中影响嵌套层级的字符
+_JSON_STRUCTURE = re.compile(r'["\\{}\[\]]')
+
+
+class _ArgumentScanner:
+    '''
+    增量检查流式工具参数（JSON）是否已经完整
+
+    只扫描引号、反斜杠与括号，记录嵌套层级与是否处于字符串中，不解析内容
+    '''
+    __slots__ = ('depth', 'started', 'in_string', 'escaped')
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> None:
+        skip = 0
+        if self.escaped:
+            # 上一个片段以反斜杠结尾，本片段的第一个字符被转义
+            self.escaped = False
+            skip = 1
+        for match in _JSON_STRUCTURE.finditer(text, skip):
+            position = match.start()
+            if position < skip:
+                continue
+            char = text[position]
+            if self.in_string:
+                if char == '\\':
+                    skip = position + 2
+                    if skip > len(text):
+                        self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+                self.started = True
+            else:
+                self.depth -= 1
+
+    @property
+    def complete(self) -> bool:
+        return self.started and self.depth <= 0 and not self.in_string
+
+
+class _StreamBuffer:
+    '''
+    流式响应的增量解码缓冲区
+
+    直接读取 delta 对象上需要的字段，不做完整的字典转换；
+    正文和工具参数以片段列表保存，结束时一次性拼接，避免逐 token 的字符串拼接。
+    某个工具调用的参数已完整、且流已经转到下一个调用或其他内容时，通过 on_ready 提前交出该调用
+    '''
+    __slots__ = ('content', '_ids', '_names', '_arguments', '_scanners', '_announced', '_ready', '_current',
+                 '_reasoning', '_on_name', '_on_ready', 'first', 'usage')
+
+    def __init__(self, reasoning: bool=True, on_name: Callable=None, on_ready: Callable=None) -> None:
+        '''
+        Args:
+            reasoning: 是否输出 reasoning_content
+            on_name: 工具名称接收完整时的回调，每个工具调用只触发一次
+            on_ready: 工具调用接收完整时的回调，参数为 (index, tool_call)
+        '''
+        self.content: list[str] = []
+        self._ids: list[list[str]] = []
+        self._names: list[list[str]] = []
+        self._arguments: list[list[str]] = []
+        self._scanners: list[_ArgumentScanner] = []
+        self._announced: list[bool] = []
+        self._ready: list[bool] = []
+        self._current: int = None   # 正在接收的工具调用
+        self._reasoning = reasoning
+        self._on_name = on_name
+        self._on_ready = on_ready
+        self.first: float = None    # 首个输出到达的时间（time.perf_counter）
+        self.usage: Any = None      # 最后一块中的 usage
+
+    def feed(self, delta: Any) -> tuple:
+        '''
+        处理一个 delta，返回需要输出给调用方的事件
+        '''
+        events = ()
+        if self._reasoning:
+            text = getattr(delta, 'reasoning_content', None)
+            if text:
+                events = ({'type': 'reasoning_content', 'content': text},)
+
+        text = delta.content
+        if text:
+            self.content.append(text)
+            events += ({'type': 'content', 'content': text},)
+
+        tool_calls = delta.tool_calls
+        if tool_calls:
+            self._feed_tool_calls(tool_calls)
+        elif self._current is not None:
+            # 流已转到其他内容，当前工具调用不会再有新的片段
+            self._settle(self._current)
+        if self.first is None and (events or tool_calls):
+            self.first = time.perf_counter()
+        return events
+
+    def _feed_tool_calls(self, tool_calls: list) -> None:
+        for tcchunk in tool_calls:
+            index = tcchunk.index
+            if self._current is not None and index != self._current:
+                self._settle(self._current)
+            self._current = index
+            while len(self._ids) <= index:
+                self._ids.append([])
+                self._names.append([])
+                self._arguments.append([])
+                self._scanners.append(_ArgumentScanner())
+                self._announced.append(False)
+                self._ready.append(False)
+
+            if tcchunk.id:
+                self._ids[index].append(tcchunk.id)
+            function = tcchunk.function
+            if function is None:
+                continue
+            if function.name:
+                self._names[index].append(function.name)
+            if function.arguments:
+                # 开始接收参数时名称已经完整
+                self._announce(index)
+                self._arguments[index].append(function.arguments)
+                if self._on_ready:
+                    self._scanners[index].feed(function.arguments)
+
+    def _announce(self, index: int) -> None:
+        if self._announced[index]:
+            return
+        self._announced[index] = True
+        if self._on_name and self._names[index]:
+            try:
+                self._on_name(''.join(self._names[index]))
+            except: pass
+
+    def _settle(self, index: int) -> None:
+        '''工具调用不会再收到片段：补发名称回调，参数完整时交给 on_ready'''
+        self._current = None
+        self._announce(index)
+        if self._on_ready and not self._ready[index] and self._scanners[index].complete:
+            self._ready[index] = True
+            self._on_ready(index, self._tool_call(index))
+
+    def finish(self) -> None:
+        '''流结束时调用，为尚未触发回调的工具调用补发名称回调'''
+        self._current = None
+        for index in range(len(self._ids)):
+            self._announce(index)
+
+    def _tool_call(self, index: int) -> dict:
+        return {
+            'id': ''.join(self._ids[index]),
+            'type': 'function',
+            'function': {
+                'name': ''.join(self._names[index]),
+                'arguments': ''.join(self._arguments[index])
+            }
+        }
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.content)
+
+    @property
+    def tool_calls(self) -> list[dict]:
+        return [self._tool_call(i) for i in range(len(self._ids))]
+
+
+# 解析文档注释使用的正则
+_DOC_ARGS = re.compile(r'Args:(.*?)(?:Returns:|$)', re.DOTALL)
+_DOC_PARAM = re.compile(r'\s*([a-zA-Z0-9_]+):\s*(.*?)(?=\s*[a-zA-Z0-9_]+:|$)', re.DOTALL)
+_DOC_WRAP = re.compile(r'\n\s+')
+_DOC_SECTIONS = ('Args:', 'Returns:', 'Example:')
+
+
+def parse_docstring(doc: str) -> Tuple[str, Dict[str, str]]:
+    '''
+    解析函数的文档注释
+
+    Returns:
+        (函数描述, 参数名到参数描述的字典)，
+        函数描述由 Args/Returns/Example 之前的内容与 Example 部分组成
+    '''
+    if not doc:
+        return '', {}
+    
+    # 一次遍历收集主要描述（第一个段落标题之前）与 Example 部分（到 Args/Returns 为止）
+    main, example = [], []
+    in_main, in_example = True, False
+    for line in doc.strip().split('\n'):
+        line = line.strip()
+        header = line.startswith(_DOC_SECTIONS)
+        if in_main and not header:
+            if line:
+                main.append(line)
+            continue
+        in_main = False
+        if line.startswith('Example:'):
+            in_example = True
+        elif header and in_example:
+            break
+        if in_example:
+            example.append(line)
+    
+    description = ' '.join(main)
+    if example:
+        example_text = '\n'.join(example)
+        description = f"{description}\n\n{example_text}"
+    
+    params = {}
+    if 'Args:' in doc:
+        match = _DOC_ARGS.search(doc)
+        if match:
+            for param in _DOC_PARAM.finditer(match.group(1).strip()):
+                params[param.group(1).strip()] = _DOC_WRAP.sub(' ', param.group(2).strip())
+    return description, params
+
+
+# 类型注解到 JSON Schema 的映射
+_JSON_TYPES = {str: 'string', int: 'integer', float: 'number', bool: 'boolean', dict: 'object', list: 'array'}
+_JSON_TYPE_NAMES = ('string', 'integer', 'number', 'boolean', 'object', 'array')
+_ARRAY_ORIGINS = (list, tuple, set, frozenset)
+_schemas: Dict[Any, dict] = {}
+
+
+def annotation_schema(annotation: Any) -> dict:
+    '''
+    将类型注解转换为 JSON Schema
+
+    支持基本类型、嵌套的 list[...] / dict[...]、Literal、Optional / Union（取第一个非None类型）、
+    dataclass 与 TypedDict，无法识别的类型视为 string。
+    结果按注解缓存，调用方不应修改返回的字典
+    '''
+    try:
+        return _schemas[annotation]
+    except KeyError:
+        schema = _schemas[annotation] = _annotation_schema(annotation, ())
+        return schema
+    except TypeError:
+        # 不可哈希的注解不缓存
+        return _annotation_schema(annotation, ())
+
+
+def _annotation_schema(annotation: Any, seen: tuple) -> dict:
+    if annotation is inspect.Parameter.empty:
+        return {'type': 'string'}
+    if annotation in _JSON_TYPES:
+        return {'type': _JSON_TYPES[annotation]}
+    
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Annotated:
+        return _annotation_schema(args[0], seen)
+    if origin is typing.Literal:
+        return {'type': _JSON_TYPES.get(type(args[0]), 'string'), 'enum': list(args)}
+    if origin is Union or origin is types.UnionType:
+        options = [arg for arg in args if arg is not type(None)]
+        return _annotation_schema(options[0], seen) if options else {'type': 'string'}
+    if origin in _ARRAY_ORIGINS:
+        schema = {'type': 'array'}
+        if args and (origin is not tuple or len(args) == 2 and args[1] is Ellipsis or len(set(args)) == 1):
+            schema['items'] = _annotation_schema(args[0], seen)
+        return schema
+    if origin is dict:
+        schema = {'type': 'object'}
+        if len(args) == 2:
+            schema['additionalProperties'] = _annotation_schema(args[1], seen)
+        return schema
+    if origin is not None:
+        name = getattr(origin, '__name__', '').lower()
+        return {'type': name if name in _JSON_TYPE_NAMES else 'string'}
+    
+    if isinstance(annotation, type) and (dataclasses.is_dataclass(annotation) or typing.is_typeddict(annotation)):
+        if annotation in seen:
+            # 递归引用自身的类型不再展开
+            return {'type': 'object'}
+        return _object_schema(annotation, seen + (annotation,))
+    
+    name = getattr(annotation, '__name__', None)
+    if isinstance(name, str) and name.lower() in _JSON_TYPE_NAMES:
+        return {'type': name.lower()}
+    return {'type': 'string'}
+
+
+def _object_schema(cls: type, seen: tuple) -> dict:
+    try:
+        hints = typing.get_type_hints(cls, include_extras=True)
+    except Exception:
+        hints = getattr(cls, '__annotations__', {})
+    
+    if dataclasses.is_dataclass(cls):
+        fields = [f for f in dataclasses.fields(cls) if f.init]
+        names = [f.name for f in fields]
+        required = [
+            f.name for f in fields
+            if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING
+        ]
     else:
-        return obj
+        names = list(hints)
+        required = [name for name in names if name in cls.__required_keys__]
+    
+    return {
+        'type': 'object',
+        'properties': {name: _annotation_schema(hints.get(name, inspect.Parameter.empty), seen) for name in names},
+        'required': required,
+        'additionalProperties': False,
+    }
+
+
+def _strict_object(schema: dict) -> None:
+    '''
+    将对象的 JSON Schema 原地转换为严格模式
+
+    所有属性都标记为 required，原本非必需的属性类型中加入 null，嵌套的对象同样处理
+    '''
+    properties = schema.get('properties', {})
+    original_required = schema.get('required', [])
+    
+    for param_name, param_info in properties.items():
+        # 如果参数不在原来的required列表中，则添加null类型
+        if param_name not in original_required:
+            param_type = param_info.get('type')
+            # 如果类型已经是列表，则添加'null'
+            if isinstance(param_type, list):
+                if 'null' not in param_type:
+                    param_type.append('null')
+            elif param_type:
+                # 转换为包含原类型和null的列表
+                param_info['type'] = [param_type, 'null']
+            enum = param_info.get('enum')
+            if enum is not None and None not in enum:
+                param_info['enum'] = enum + [None]
+        _strict_nested(param_info)
+    
+    # 所有参数都是必需的，但类型可能包含null
+    schema['required'] = list(properties.keys())
+    schema['additionalProperties'] = False
+
+
+def _strict_nested(schema: dict) -> None:
+    if 'properties' in schema:
+        _strict_object(schema)
+    items = schema.get('items')
+    if isinstance(items, dict):
+        _strict_nested(items)
 
 
 class Identify:
+    # 指标注册表，默认使用全局注册表
+    metrics: Metrics = default_metrics
+
     def __init__(self, 
                  default_description='No documentation provided', 
                  var_positional_desc='Variable length argument list', 
-                 var_keyword_desc='Arbitrary keyword arguments') -> None:
+                 var_keyword_desc='Arbitrary keyword arguments',
+                 max_workers: int=1,
+                 call_timeout: float=None,
+                 schema_cache: str=None) -> None:
         '''
         初始化Identify类
         
@@ -68,6 +1092,10 @@ class Identify:
             default_description: 普通参数没有文档注释时使用的默认描述
             var_positional_desc: 可变位置参数(*args)没有文档注释时使用的默认描述
             var_keyword_desc: 可变关键字参数(**kwargs)没有文档注释时使用的默认描述
+            max_workers: calls 并发执行工具调用的线程数，为1时按顺序执行
+            call_timeout: 每个工具调用的超时时间（秒），从该调用开始执行时计时，为None时不限制；
+                          设置后顺序模式下的调用也在线程池中执行，超时后放弃等待其结果，并换用新的线程池
+            schema_cache: 函数元数据缓存文件的路径，调用 save_schema_cache 后写入，为None时不缓存
         '''
         self._functions: dict[str, Any] = {}
         self._map: dict[
@@ -79,6 +1107,54 @@ class Identify:
         self.var_keyword_desc = var_keyword_desc
         self.on_calling: Callable = None
         self.on_called: Callable = None
+
+        # 函数元数据的文件缓存，键为 模块.限定名:函数名
+        self.schema_cache = schema_cache
+        self._schema_entries: dict[str, dict] = self._load_schema_cache()
+        self._schema_dirty = False
+
+        # 工具列表缓存，仅在 identify / extend / add_mcp / remove_mcp 时失效
+        self._version: int = 0
+        self._schemas: dict[tuple, ToolSchema] = {}
+
+        # 并发调用工具的线程池，首次使用时创建
+        self.max_workers = max_workers
+        self.call_timeout = call_timeout
+        self._executor: ThreadPoolExecutor = None
+        self._executor_lock = threading.Lock()
+        
+        # 已添加的MCP服务器，工具列表在首次需要时获取
+        self._mcp: dict[str, dict] = {}
+        self._mcp_lock = threading.RLock()
+    
+    @property
+    def version(self) -> int:
+        '''已注册函数的版本号，每次注册或移除函数时递增'''
+        return self._version
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        '''并发调用工具使用的线程池'''
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers        = max(self.max_workers, 1),
+                        thread_name_prefix = 'identify-call'
+                    )
+        return self._executor
+    
+    def shutdown(self, wait: bool=True) -> None:
+        '''关闭并发调用使用的线程池'''
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+    
+    def _invalidate(self) -> None:
+        '''使工具列表缓存失效'''
+        self._version += 1
+        self._schemas.clear()
     
     @property
     def functions_list(self) -> Dict[str, str]:
@@ -88,6 +1164,8 @@ class Identify:
         Returns:
             dict: 函数列表，其中键是函数名称，值是函数描述
         """
+        if self._mcp_due():
+            self.load_mcp()
         result = {}
         for func_name, func_info in self._functions.items():
             result[func_name] = func_info['description']
@@ -114,6 +1192,9 @@ class Identify:
         Args:
             idf: 要合并的Identify实例
         '''
+        if idf._mcp_due():
+            idf.load_mcp()
+        
         # 合并函数元数据信息
         for func_name, func_info in idf._functions.items():
             if func_name not in self._functions:
@@ -124,17 +1205,117 @@ class Identify:
             if func_name not in self._map:
                 self._map[func_name] = func_map
         
+        self._invalidate()
         return self
     
-    def add_mcp(self, mcp: MCPClient):
+    def add_mcp(self, mcp: MCPClient, cache: Union[CachePolicy, Dict[str, CachePolicy]]=None,
+                lazy: bool=False, refresh: float=None):
+        '''
+        注册MCP服务器提供的全部工具
+        
+        Args:
+            mcp: MCP客户端，提供 acall_tool（或 call_tool 为协程函数）时，
+                 acall/acalls 直接在事件循环中并发执行，不占用线程；call/calls 仍使用同步的 call_tool
+            cache: 结果缓存策略，可以是应用于全部工具的 CachePolicy，
+                   也可以是工具名到 CachePolicy 的字典（只缓存其中列出的只读工具）
+            lazy: 是否延迟获取工具列表，延迟注册的服务器在首次需要工具时并行获取
+            refresh: 工具列表的刷新间隔（秒），为None时只获取一次
+        '''
+        with self._mcp_lock:
+            self._mcp[mcp.server_name] = {
+                'client' : mcp,
+                'cache'  : cache,
+                'refresh': refresh,
+                'loaded' : None,
+                'tools'  : None,
+            }
+        if not lazy:
+            self.load_mcp(mcp.server_name)
+    
+    def _mcp_due(self) -> bool:
+        '''是否有尚未获取或需要刷新工具列表的MCP服务器'''
+        if not self._mcp:
+            return False
+        now = time.monotonic()
+        return any(
+            entry['loaded'] is None or
+            entry['refresh'] is not None and now - entry['loaded'] >= entry['refresh']
+            for entry in self._mcp.values()
+        )
+    
+    def load_mcp(self, name: str=None, force: bool=False) -> None:
+        '''
+        获取MCP服务器的工具列表并注册
+        
+        多个服务器的工具列表并行获取，工具列表未变化时不会使工具列表缓存失效
+        
+        Args:
+            name: MCP服务器名称，为空时处理全部服务器
+            force: 是否忽略刷新间隔强制重新获取
+        '''
+        with self._mcp_lock:
+            now = time.monotonic()
+            targets = [
+                entry for server, entry in self._mcp.items()
+                if (name is None or server == name) and (
+                    force or entry['loaded'] is None or
+                    entry['refresh'] is not None and now - entry['loaded'] >= entry['refresh']
+                )
+            ]
+            if not targets:
+                return
+            
+            if len(targets) == 1:
+                listed = [self._list_mcp_tools(targets[0]['client'])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix='identify-mcp') as pool:
+                    listed = list(pool.map(lambda entry: self._list_mcp_tools(entry['client']), targets))
+            
+            # 在副本上注册后整体替换，其他线程遍历中的工具表不会被修改
+            functions, mapping = dict(self._functions), dict(self._map)
+            changed = False
+            for entry, tools in zip(targets, listed):
+                entry['loaded'] = time.monotonic()
+                if tools != entry['tools']:
+                    self._register_mcp_tools(entry, tools, functions, mapping)
+                    entry['tools'] = tools
+                    changed = True
+            if changed:
+                self._functions, self._map = functions, mapping
+                self._invalidate()
+    
+    @staticmethod
+    def _list_mcp_tools(mcp: MCPClient) -> list:
         tools = mcp.list_tools()
+        if inspect.iscoroutine(tools):
+            tools = asyncio.run(tools)
+        return list(tools)
+    
+    def _register_mcp_tools(self, entry: dict, tools: list, functions: dict, mapping: dict) -> None:
+        mcp = entry['client']
+        cache = entry['cache']
+        
+        # 移除该服务器已下线的工具
+        names = {tool['name'] for tool in tools}
+        for func_name in [
+            func_name for func_name, func_info in mapping.items()
+            if func_info.get('mcp_name') == mcp.server_name and func_name not in names
+        ]:
+            functions.pop(func_name, None)
+            mapping.pop(func_name, None)
+        
+        # 异步客户端另外注册协程版本，只由 acall 使用，并发调用在调用方的事件循环中多路复用
+        acall_tool = getattr(mcp, 'acall_tool', None)
+        if acall_tool is None and inspect.iscoroutinefunction(mcp.call_tool):
+            acall_tool = mcp.call_tool
+        
         for tool in tools:
             func_name = tool['name']
             description = tool['description']
             parameters = tool['inputSchema']
             
             # 注册函数元数据
-            self._functions[func_name] = {
+            functions[func_name] = {
                 'type': 'function',
                 'name': func_name,
                 'description': description,
@@ -147,11 +1328,25 @@ class Identify:
                     return mcp.call_tool(current_func_name, input_data=kwargs)
                 return mcp_tool
             
-            # 生成并存储工具函数
-            self._map[func_name] = {
+            def create_async_tool_function(current_func_name):
+                async def mcp_tool(**kwargs):
+                    return await acall_tool(current_func_name, input_data=kwargs)
+                return mcp_tool
+            
+            # 生成并存储工具函数，刷新时保留已有的结果缓存
+            previous = mapping.get(func_name, {})
+            mapping[func_name] = {
                 'original_function': create_tool_function(func_name),  # 立即绑定当前func_name
                 'mcp_name': mcp.server_name,
             }
+            if acall_tool is not None:
+                mapping[func_name]['async_function'] = create_async_tool_function(func_name)
+            policy = cache.get(func_name) if isinstance(cache, dict) else cache
+            if policy is not None:
+                tool_cache = previous.get('cache')
+                if tool_cache is None or tool_cache.policy is not policy:
+                    tool_cache = ToolCache(policy, mapping[func_name]['original_function'])
+                mapping[func_name]['cache'] = tool_cache
     
     def remove_mcp(self, name: str) -> None:
         """移除指定MCP服务器的所有工具
@@ -159,65 +1354,110 @@ class Identify:
         Args:
             name: MCP服务器名称
         """
-        # 找出所有属于该MCP服务器的工具
-        to_remove = [
-            func_name for func_name, func_info in self._map.items() 
-            if func_info.get('mcp_name') == name
-        ]
+        with self._mcp_lock:
+            # 找出所有属于该MCP服务器的工具
+            to_remove = [
+                func_name for func_name, func_info in self._map.items() 
+                if func_info.get('mcp_name') == name
+            ]
+            
+            # 在副本上批量移除后整体替换
+            if to_remove:
+                functions, mapping = dict(self._functions), dict(self._map)
+                for func_name in to_remove:
+                    functions.pop(func_name, None)
+                    mapping.pop(func_name, None)
+                self._functions, self._map = functions, mapping
+            self._mcp.pop(name, None)
         
-        # 批量移除
-        for func_name in to_remove:
-            self._functions.pop(func_name, None)
-            self._map.pop(func_name, None)
+        if to_remove:
+            self._invalidate()
         
-    def identify(self, func: Callable[..., Any]) -> Callable[..., Any]:
+    def identify(self, func: Callable[..., Any]=None, *, cache: CachePolicy=None) -> Callable[..., Any]:
         '''
         装饰器，用于收集函数的元数据并按照API格式存储函数
+
+        可直接使用 @identify，也可以使用 @identify(cache=CachePolicy(...)) 缓存幂等函数的结果
+
+        Args:
+            func: 要注册的函数
+            cache: 结果缓存策略，为None时不缓存
         '''
+        if func is None:
+            return lambda func: self.identify(func, cache=cache)
+        
         # 获取函数名称
         func_name = func.__name__
         
-        # 获取函数签名信息
-        signature = inspect.signature(func)
+        # 存储API格式的函数信息，签名与文档未变化时直接使用 schema_cache 中的结果
+        self._functions[func_name] = self._describe(func)
+        self._map[func_name] = {
+            'original_function': func,  # 保留原始函数以便调用
+        }
+        if cache is not None:
+            self._map[func_name]['cache'] = ToolCache(cache, func)
+        self._invalidate()
         
-        # 获取函数文档字符串
-        doc = func.__doc__ or ''
-        
-        # 提取函数描述和Example部分
-        if doc:
-            # 提取主要描述（Args部分之前的内容）
-            main_description_parts = []
-            for line in doc.strip().split('\n'):
-                line = line.strip()
-                if line.startswith('Args:') or line.startswith('Returns:') or line.startswith('Example:'):
-                    break
-                if line:
-                    main_description_parts.append(line)
-            main_description = ' '.join(main_description_parts)
-            
-            # 提取Example部分（如果存在）
-            example_parts = []
-            in_example = False
-            for line in doc.strip().split('\n'):
-                line = line.strip()
-                if line.startswith('Example:'):
-                    in_example = True
-                    example_parts.append(line)
-                    continue
-                
-                if in_example:
-                    if line.startswith('Args:') or line.startswith('Returns:'):
-                        break
-                    example_parts.append(line)
-            
-            # 组合描述
-            if example_parts:
-                example_text = '\n'.join(example_parts)
-                description = f"{main_description}\n\n{example_text}"
-            else:
-                description = main_description
+        # 创建包装函数，保持原函数行为不变（异步函数仍返回协程）
+        if inspect.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                return await func(*args, **kwargs)
         else:
-            description = ''
+            def wrapper(*args, **kwargs):
+                return func(*args, **kwargs)
+        
+        # 保留原函数的元数据
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__annotations__ = func.__annotations__
+        
+        return wrapper
+    
+    def _describe(self, func: Callable[..., Any]) -> dict:
+        '''生成函数的API格式元数据，优先读取 schema_cache'''
+        if self.schema_cache is None:
+            return self._introspect(func)
+        fingerprint = self._fingerprint(func)
+        if fingerprint is None:
+            return self._introspect(func)
+        
+        # 工厂函数生成并改名的工具共用同一个 __qualname__，键中需要包含 __name__
+        key = f'{func.__module__}.{func.__qualname__}:{func.__name__}'
+        entry = self._schema_entries.get(key)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            return entry['function']
+        info = self._introspect(func)
+        self._schema_entries[key] = {'fingerprint': fingerprint, 'function': info}
+        self._schema_dirty = True
+        return info
+    
+    def _fingerprint(self, func: Callable[..., Any]) -> str:
+        '''
+        函数签名与文档的指纹，不需要 inspect 即可计算
+
+        注解中引用的 dataclass / TypedDict 字段变化不会改变指纹，修改后需删除缓存文件
+        '''
+        code = getattr(func, '__code__', None)
+        if code is None:
+            return None
+        argcount = code.co_argcount + code.co_kwonlyargcount
+        argcount += bool(code.co_flags & inspect.CO_VARARGS) + bool(code.co_flags & inspect.CO_VARKEYWORDS)
+        parts = (
+            func.__qualname__, func.__name__, func.__doc__, code.co_varnames[:argcount], code.co_flags,
+            repr(func.__defaults__), repr(func.__kwdefaults__), repr(func.__annotations__),
+            self.default_description, self.var_positional_desc, self.var_keyword_desc,
+        )
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    
+    def _introspect(self, func: Callable[..., Any]) -> dict:
+        '''通过签名、类型注解与文档注释生成函数的API格式元数据'''
+        signature = inspect.signature(func)
+        description, param_descriptions = parse_docstring(func.__doc__ or '')
+        try:
+            # 解析字符串形式的注解（from __future__ import annotations）
+            hints = typing.get_type_hints(func, include_extras=True)
+        except Exception:
+            hints = {}
         
         # 构建参数信息
         parameters = {
@@ -226,22 +1466,6 @@ class Identify:
             'required': []
         }
         
-        # 解析文档中的参数描述
-        param_descriptions = {}
-        if doc:
-            # 改进Args部分的解析
-            arg_pattern = re.compile(r'Args:(.*?)(?:Returns:|$)', re.DOTALL)
-            arg_match = arg_pattern.search(doc)
-            if arg_match:
-                arg_section = arg_match.group(1).strip()
-                param_pattern = re.compile(r'\s*([a-zA-Z0-9_]+):\s*(.*?)(?=\s*[a-zA-Z0-9_]+:|$)', re.DOTALL)
-                for match in param_pattern.finditer(arg_section):
-                    param_name = match.group(1).strip()
-                    param_desc = match.group(2).strip()
-                    # 处理换行和多余空格
-                    param_desc = re.sub(r'\n\s+', ' ', param_desc)
-                    param_descriptions[param_name] = param_desc
-        
         # 处理函数参数
         for param_name, param in signature.parameters.items():
             # 跳过self参数
@@ -269,10 +1493,8 @@ class Identify:
                 continue
                 
             # 处理普通参数
-            param_info = {
-                'type': self._get_type_name(param.annotation),
-                'description': param_descriptions.get(param_name, self.default_description)
-            }
+            param_info = dict(annotation_schema(hints.get(param_name, param.annotation)))
+            param_info['description'] = param_descriptions.get(param_name, self.default_description)
             
             # 检查是否有默认值（非必需参数）
             if param.default is param.empty:
@@ -284,160 +1506,119 @@ class Identify:
             
             parameters['properties'][param_name] = param_info
         
-        # 存储API格式的函数信息
-        self._functions[func_name] = {
+        return {
             'type': 'function',
-            'name': func_name,
+            'name': func.__name__,
             'description': description,
             'parameters': parameters,
         }
-        self._map[func_name] = {
-            'original_function': func,  # 保留原始函数以便调用
-        }
-        
-        # 创建包装函数，保持原函数行为不变
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        
-        # 保留原函数的元数据
-        wrapper.__name__ = func.__name__
-        wrapper.__doc__ = func.__doc__
-        wrapper.__annotations__ = func.__annotations__
-        
-        return wrapper
+    
+    def save_schema_cache(self, path: str=None) -> None:
+        '''
+        将已生成的函数元数据写入缓存文件，下次启动时签名与文档未变化的函数不再重新解析
+
+        Args:
+            path: 缓存文件路径，为空时使用 schema_cache
+        '''
+        path = path or self.schema_cache
+        if not path:
+            raise ValueError("未设置 schema_cache 路径")
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'functions': self._schema_entries}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp, path)
+        self._schema_dirty = False
+    
+    def _load_schema_cache(self) -> dict:
+        if not self.schema_cache or not os.path.exists(self.schema_cache):
+            return {}
+        try:
+            with open(self.schema_cache, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != 1:
+            return {}
+        return data.get('functions') or {}
     
     def _get_type_name(self, annotation):
         '''从类型注解中获取类型名称'''
-        if annotation is inspect.Parameter.empty:
-            return 'string'
-        
-        # 特殊处理泛型dict类型，直接返回object
-        if getattr(annotation, '__origin__', None) is dict:
-            return 'object'
-            
-        # 特殊处理泛型list类型，直接返回array
-        if getattr(annotation, '__origin__', None) is list:
-            return 'array'
-            
-        # 处理Python 3.10+ Union类型 (int|str)
-        if hasattr(annotation, '__or__') and hasattr(annotation, '__args__'):
-            # Union类型会有__args__属性包含所有可能的类型
-            types = []
-            for arg in annotation.__args__:
-                # 递归处理Union中的每个类型
-                type_name = self._get_type_name(arg)
-                if type_name not in types:
-                    types.append(type_name)
-            # 如果是多个类型，返回第一个有效类型
-            if types:
-                return types[0]
-            return 'string'  # 默认返回 string
-        
-        # 处理typing模块中的Union类型 (Union[int, str])
-        if hasattr(annotation, '__origin__') and annotation.__origin__ is Union:
-            types = []
-            for arg in annotation.__args__:
-                type_name = self._get_type_name(arg)
-                if type_name not in types:
-                    types.append(type_name)
-            if types:
-                return types[0]
-            return 'string'  # 默认返回 string
-        
-        # 处理其他泛型类型
-        if hasattr(annotation, '__origin__'):
-            origin = annotation.__origin__
-            try:
-                type_name = str(origin.__name__).lower()
-                if type_name in ['string', 'integer', 'number', 'boolean', 'object', 'array']:
-                    return type_name
-                return 'string'  # 未知类型返回 string
-            except AttributeError:
-                return 'string'  # 未知类型返回 string
-        
-        # 处理基本类型
-        if annotation is str:
-            return 'string'
-        if annotation is int:
-            return 'integer'
-        if annotation is float:
-            return 'number'
-        if annotation is bool:
-            return 'boolean'
-        if annotation is dict:
-            return 'object'
-        if annotation is list:
-            return 'array'
-        
-        # 默认情况
-        try:
-            type_name = str(annotation.__name__).lower()
-            if type_name in ['string', 'integer', 'number', 'boolean', 'object', 'array']:
-                return type_name
-            return 'string'  # 未知类型返回 string
-        except AttributeError:
-            return 'string'  # 未知类型返回 string
+        return annotation_schema(annotation).get('type', 'string')
     
     def req_info(self, func_name: str=None, strict=False) -> dict:
         '''
         获取指定函数的API格式元数据信息
         
         Args:
-            func_name: 函数名称
+            func_name: 函数名称，为空时返回所有函数（req_tools 缓存的副本，修改不会影响后续请求）
             strict: 是否使用严格模式
                    严格模式下，所有参数都会被标记为required，
                    非必需参数会被设置为[type, 'null']类型
         '''
         if not func_name:
-            info = []
-            for f in self._functions:
-                info.append(self.req_info(f, strict=strict))
-            return info
+            return copy.deepcopy(list(self.req_tools(strict=strict).tools))
+        if func_name not in self._functions and self._mcp_due():
+            self.load_mcp()
         if func_name in self._functions:
-            func_info = dict(self._functions[func_name])  # 创建一个副本避免修改原始数据
-            
-            if strict:
-                # 添加严格模式标记
-                func_info['strict'] = True
-                
-                # 获取参数信息的副本
-                parameters = dict(func_info['parameters'])
-                properties = dict(parameters['properties'])
-                
-                # 所有参数都是必需的，但类型可能包含null
-                all_params = list(properties.keys())
-                original_required = parameters.get('required', [])
-                
-                # 处理每个参数的类型
-                for param_name, param_info in properties.items():
-                    # 如果参数不在原来的required列表中，则添加null类型
-                    if param_name not in original_required:
-                        param_type = param_info['type']
-                        # 如果类型已经是列表，则添加'null'
-                        if isinstance(param_type, list):
-                            if 'null' not in param_type:
-                                param_type.append('null')
-                        else:
-                            # 转换为包含原类型和null的列表
-                            param_info['type'] = [param_type, 'null']
-                
-                # 更新参数信息
-                parameters['required'] = all_params
-                parameters['additionalProperties'] = False
-                
-                # 更新func_info中的参数信息
-                func_info['parameters'] = parameters
-            
-            # 修改结构
-            func_info.pop('type')
-            func_info = {
-                'type': 'function',
-                'function': func_info
-            }
-
-            return func_info
+            return self._build_info(func_name, strict=strict)
         return None
     
+    def req_tools(self, strict=False, ordered=False) -> ToolSchema:
+        '''
+        获取所有函数的预编译工具列表
+        
+        结果按严格模式与排序方式分别缓存，只有在 identify、extend、add_mcp、remove_mcp
+        改变已注册函数时才会重新生成。
+        
+        Args:
+            strict: 是否使用严格模式
+            ordered: 是否按函数名排序并按键名排列每个工具的字段，
+                     使工具列表与注册顺序、MCP 重新加载的顺序无关
+            
+        Returns:
+            ToolSchema: 只读的工具列表及其 JSON 字节串
+        '''
+        if self._mcp_due():
+            self.load_mcp()
+        cached = self._schemas.get((strict, ordered))
+        if cached is not None and cached.version == self._version:
+            return cached
+        
+        started = time.perf_counter() if self.metrics.enabled else None
+        if ordered:
+            tools = tuple(
+                json.loads(json.dumps(self._build_info(f, strict=strict), sort_keys=True))
+                for f in sorted(self._functions)
+            )
+        else:
+            tools = tuple(self._build_info(f, strict=strict) for f in self._functions)
+        schema = ToolSchema(
+            version = self._version,
+            strict  = strict,
+            tools   = tools,
+            payload = json.dumps(tools, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+        )
+        self._schemas[(strict, ordered)] = schema
+        if started is not None:
+            self.metrics.observe('schema_build_seconds', time.perf_counter() - started, strict=strict)
+        return schema
+    
+    def _build_info(self, func_name: str, strict=False) -> dict:
+        '''生成单个函数的API格式元数据，返回深拷贝以免修改原始数据'''
+        func_info = copy.deepcopy(self._functions[func_name])
+        
+        if strict:
+            # 添加严格模式标记
+            func_info['strict'] = True
+            _strict_object(func_info['parameters'])
+        
+        # 修改结构
+        func_info.pop('type')
+        return {
+            'type': 'function',
+            'function': func_info
+        }
+    
     def call(self, function_name:str, *args, **kwargs):
         '''
         通过函数名调用已注册的函数
@@ -454,72 +1635,616 @@ class Identify:
             ValueError: 函数名不存在时抛出异常
             Exception: 函数调用出错时抛出原始异常
         '''
+        if function_name not in self._map and self._mcp_due():
+            self.load_mcp()
         if function_name not in self._map:
             raise ValueError(f"函数 '{function_name}' 未注册")
             
-        func = self._map[function_name]['original_function']
+        func_info = self._map[function_name]
+        func = func_info['original_function']
+        cached, key = self._cache_lookup(function_name, args, kwargs)
+        if cached is not ToolCache.MISS:
+            return cached
         if self.on_calling:
             try:
                 new_func = self.on_calling(func, args, kwargs)
-                if isinstance(new_func, callable): func = new_func
-            except: pass
+                if callable(new_func): func = new_func
+            except: self.metrics.hook_error('on_calling')
         
         result = None
+        started = time.perf_counter() if self.metrics.enabled else None
         try:
             # 调用函数并返回结果
             result = func(*args, **kwargs)
+            if inspect.iscoroutine(result):
+                # 同步路径调用异步函数时，在当前线程中运行至完成
+                result = asyncio.run(result)
         except Exception as e:
+            if started is not None:
+                self.metrics.inc('tool_errors', tool=function_name)
             # 捕获执行错误，添加更多上下文信息
             raise Exception(f"调用函数 '{function_name}' 时出错: {str(e)}") from e
         finally:
             if self.on_called:
                 try:
                     self.on_called(func, result)
-                except: pass
-            return result if result else None
+                except: self.metrics.hook_error('on_called')
+            if started is not None:
+                self._observe_call(function_name, started)
+        if key is not None:
+            func_info['cache'].put(key, result if result else None)
+        return result if result else None
     
-    def calls(self, info:list) -> dict:
-        final = []
-        for call in to_dict_recursive(info):
-            funtion_name = call['function']['name']
+    async def acall(self, function_name:str, *args, **kwargs):
+        '''
+        call 的异步版本
+
+        异步函数直接在事件循环中等待，同步函数放到线程中执行以免阻塞事件循环
+
+        Raises:
+            ValueError: 函数名不存在时抛出异常
+            Exception: 函数调用出错时抛出原始异常
+        '''
+        if function_name not in self._map and self._mcp_due():
+            await asyncio.to_thread(self.load_mcp)
+        if function_name not in self._map:
+            raise ValueError(f"函数 '{function_name}' 未注册")
+            
+        # 异步MCP客户端的工具使用其协程版本
+        func_info = self._map[function_name]
+        func = func_info.get('async_function') or func_info['original_function']
+        cached, key = self._cache_lookup(function_name, args, kwargs)
+        if cached is not ToolCache.MISS:
+            return cached
+        if self.on_calling:
             try:
-                kwargs = json.loads(call['function']['arguments'])
-            except:
-                raise Exception
-
-            result = {
-                "tool_call_id": call['id'],
-                "role": "tool",
-                "name": funtion_name,
-                "content": str(to_dict_recursive(self.call(funtion_name, **kwargs))),
-            }
-            final.append(result)
+                new_func = self.on_calling(func, args, kwargs)
+                if callable(new_func): func = new_func
+            except: self.metrics.hook_error('on_calling')
+        
+        result = None
+        started = time.perf_counter() if self.metrics.enabled else None
+        try:
+            if inspect.iscoroutinefunction(func):
+                result = await func(*args, **kwargs)
+            else:
+                result = await asyncio.to_thread(func, *args, **kwargs)
+                if inspect.iscoroutine(result):
+                    result = await result
+        except Exception as e:
+            if started is not None:
+                self.metrics.inc('tool_errors', tool=function_name)
+            raise Exception(f"调用函数 '{function_name}' 时出错: {str(e)}") from e
+        finally:
+            if self.on_called:
+                try:
+                    self.on_called(func, result)
+                except: self.metrics.hook_error('on_called')
+            if started is not None:
+                self._observe_call(function_name, started)
+        if key is not None:
+            func_info['cache'].put(key, result if result else None)
+        return result if result else None
+    
+    def _cache_lookup(self, function_name:str, args:tuple, kwargs:dict) -> tuple:
+        '''
+        查询工具的结果缓存
+
+        Returns:
+            (缓存的结果或 ToolCache.MISS, 缓存键)，工具未配置缓存时缓存键为None
+        '''
+        cache: ToolCache = self._map[function_name].get('cache')
+        if cache is None:
+            return ToolCache.MISS, None
+        key = cache.key(args, kwargs)
+        result = cache.get(key)
+        if self.metrics.enabled:
+            hit = result is not ToolCache.MISS
+            self.metrics.inc('tool_cache_hits' if hit else 'tool_cache_misses', tool=function_name)
+        return result, key
+    
+    def clear_cache(self, function_name:str=None) -> None:
+        '''
+        清空工具的结果缓存
+
+        Args:
+            function_name: 函数名，为空时清空全部工具的缓存
+        '''
+        names = [function_name] if function_name else list(self._map)
+        for name in names:
+            cache = self._map.get(name, {}).get('cache')
+            if cache is not None:
+                cache.clear()
+    
+    @property
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        '''各工具结果缓存的条目数与命中、未命中次数'''
+        return {
+            name: func_map['cache'].stats
+            for name, func_map in self._map.items() if 'cache' in func_map
+        }
+    
+    def _observe_call(self, function_name:str, started:float) -> None:
+        finished = time.perf_counter()
+        self.metrics.inc('tool_calls', tool=function_name)
+        self.metrics.observe('tool_call_seconds', finished - started, tool=function_name)
+        self.metrics.record_span('identify.call', started, finished, tool=function_name)
+    
+    def _call_one(self, call: dict) -> dict:
+        '''
+        执行单个 tool_call 并生成对应的 tool 消息
+
+        参数解析失败或函数出错时，不抛出异常，而是将错误信息作为消息内容返回给模型
+        '''
+        function_name = call['function']['name']
+        try:
+            kwargs = json.loads(call['function']['arguments'] or '{}')
+            content = str(to_dict_recursive(self.call(function_name, **kwargs)))
+        except Exception as e:
+            content = self._error_content(function_name, e)
+        return self._tool_message(call, content)
+    
+    async def _acall_one(self, call: dict, timeout: float=None) -> dict:
+        '''_call_one 的异步版本'''
+        function_name = call['function']['name']
+        try:
+            kwargs = json.loads(call['function']['arguments'] or '{}')
+            result = await asyncio.wait_for(self.acall(function_name, **kwargs), timeout)
+            content = str(to_dict_recursive(result))
+        except Exception as e:
+            content = self._error_content(function_name, e)
+        return self._tool_message(call, content)
+    
+    @staticmethod
+    def _tool_message(call: dict, content: str) -> dict:
+        return {
+            "tool_call_id": call['id'],
+            "role": "tool",
+            "name": call['function']['name'],
+            "content": content,
+        }
+    
+    @staticmethod
+    def _error_content(function_name: str, error: BaseException) -> str:
+        if isinstance(error, (TimeoutError, FutureTimeoutError)):
+            return f"调用函数 '{function_name}' 超时"
+        message = str(error)
+        if message.startswith(f"调用函数 '{function_name}'"):
+            return message
+        return f"调用函数 '{function_name}' 时出错: {message}"
+    
+    def submit(self, call:dict) -> Future:
+        '''
+        在线程池中提前执行单个 tool_call
+
+        Args:
+            call: 模型返回的单个 tool_call
+
+        Returns:
+            Future: 结果为对应的 tool 消息，可通过 calls 的 dispatched 参数交回
+        '''
+        return self._submit(to_dict_recursive(call))
+    
+    def _submit(self, call:dict) -> Future:
+        '''提交调用，并在 Future 上记录调用实际开始执行的时间（call_started.at）'''
+        started = threading.Event()
+        started.at = None
+        executor = self.executor
+        future = executor.submit(self._call_started, call, started)
+        future.call_started = started
+        future.call_executor = executor
+        # 未开始就被取消时也要唤醒等待者
+        future.add_done_callback(lambda _: started.set())
+        return future
+    
+    def _call_started(self, call:dict, started:threading.Event) -> dict:
+        started.at = time.monotonic()
+        started.set()
+        return self._call_one(call)
+    
+    def _retire_executor(self, executor:ThreadPoolExecutor) -> None:
+        '''弃用仍有线程卡在超时调用中的线程池，之后的调用使用新的线程池'''
+        with self._executor_lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor = None
+        # 已排队的调用仍会在原线程池中执行，不等待其结束
+        executor.shutdown(wait=False)
+    
+    def _wait_call(self, call:dict, future:Future, timeout:float, since:float) -> dict:
+        '''
+        等待单个调用的结果
+
+        排队等待开始执行的时间以 timeout 为限（从 since 起算），开始执行后重新计时，
+        在此期间未能开始的调用按超时处理
+        '''
+        try:
+            started = getattr(future, 'call_started', None)
+            if timeout is not None and started is not None:
+                if not started.wait(max(since + timeout - time.monotonic(), 0)):
+                    raise FutureTimeoutError()
+                since = started.at or time.monotonic()
+            remaining = None if timeout is None else max(since + timeout - time.monotonic(), 0)
+            return future.result(timeout=remaining)
+        except Exception as e:
+            # 已开始执行的线程无法被中断，只能放弃等待其结果，并让之后的调用不再排在它后面
+            if not future.cancel() and not future.done():
+                self._retire_executor(getattr(future, 'call_executor', None))
+            return self._tool_message(call, self._error_content(call['function']['name'], e))
+    
+    def calls(self, info:list, parallel:bool=None, timeout:float=None, dispatched:Dict[int, Future]=None) -> list:
+        '''
+        执行模型返回的一组 tool_calls
+
+        Args:
+            info: 模型返回的 tool_calls 列表
+            parallel: 是否并发执行，为None时由 max_workers 决定
+            timeout: 每个调用的超时时间（秒），从该调用开始执行时计时，为None时使用 call_timeout
+            dispatched: 已通过 submit 提前执行的调用，键为其在 info 中的位置
+
+        Returns:
+            list: 与 info 顺序一致的 tool 消息列表，
+                  单个调用失败或超时时，错误信息作为该调用的消息内容
+        '''
+        info = to_dict_recursive(info)
+        if parallel is None:
+            parallel = self.max_workers > 1
+        if timeout is None:
+            timeout = self.call_timeout
+        
+        if not dispatched and timeout is None and (not parallel or len(info) < 2):
+            return [self._call_one(call) for call in info]
+        
+        # 顺序模式下逐个提交；非 submit 创建的 Future 无法得知开始时间，从此刻开始计时
+        entered = time.monotonic()
+        dispatched = dispatched or {}
+        futures = [
+            (call, dispatched.get(i) or (self._submit(call) if parallel else None))
+            for i, call in enumerate(info)
+        ]
+        final = []
+        for call, future in futures:
+            since = entered
+            if future is None:
+                if timeout is None:
+                    final.append(self._call_one(call))
+                    continue
+                future = self._submit(call)
+                since = time.monotonic()
+            final.append(self._wait_call(call, future, timeout, since))
         return final
+    
+    def asubmit(self, call:dict, timeout:float=None) -> asyncio.Task:
+        '''submit 的异步版本，在当前事件循环中创建执行单个 tool_call 的任务'''
+        if timeout is None:
+            timeout = self.call_timeout
+        return asyncio.ensure_future(self._acall_one(to_dict_recursive(call), timeout))
+    
+    async def acalls(self, info:list, timeout:float=None, dispatched:Dict[int, asyncio.Task]=None) -> list:
+        '''
+        calls 的异步版本，所有调用在事件循环中并发执行
+
+        Args:
+            info: 模型返回的 tool_calls 列表
+            timeout: 每个调用的超时时间（秒），为None时使用 call_timeout
+            dispatched: 已通过 asubmit 提前执行的调用，键为其在 info 中的位置
+
+        Returns:
+            list: 与 info 顺序一致的 tool 消息列表
+        '''
+        info = to_dict_recursive(info)
+        if timeout is None:
+            timeout = self.call_timeout
+        dispatched = dispatched or {}
+        return list(await asyncio.gather(*(
+            dispatched.get(i) or self._acall_one(call, timeout) for i, call in enumerate(info)
+        )))
+
+
+def estimate_tokens(text: str) -> int:
+    '''
+    按字符粗略估计 token 数量，在没有本地分词器时使用
+
+    ASCII 字符约 4 个计为 1 个 token，其余字符（如中文）每个计为 1 个 token
+    '''
+    if not text:
+        return 0
+    chars = len(text)
+    # UTF-8 下非 ASCII 字符大多占 3 字节，由字节数差估计其数量
+    wide = min((len(text.encode('utf-8')) - chars) // 2, chars)
+    return (chars - wide + 3) // 4 + wide
+
+
+class ContextWindow:
+    '''
+    按模型的 token 预算裁剪发送给模型的对话历史
+
+    只影响每次请求的消息列表，不修改 Mind._memories。
+    历史按轮分组裁剪：带 tool_calls 的 assistant 消息与其后的 tool 结果属于同一组，
+    不会被拆开；最新的一组总是保留。
+    '''
+    def __init__(self,
+                 budgets: Dict[str, int]=None,
+                 default_budget: int=None,
+                 reserve: int=1024,
+                 tokenizer: Callable[[str], int]=None,
+                 summarizer: Callable[[list], str]=None,
+                 overhead: int=4,
+                 slack: float=0.25) -> None:
+        '''
+        Args:
+            budgets: 模型名称到上下文 token 上限的映射
+            default_budget: 未在 budgets 中列出的模型使用的上限，为None时不裁剪
+            reserve: 为模型输出预留的 token 数
+            tokenizer: 计算文本 token 数的函数，为None时使用 estimate_tokens
+            summarizer: 将被裁掉的消息总结为一段文本的函数，为None时直接丢弃
+            overhead: 每条消息额外计入的 token 数
+            slack: 稳定布局下需要移动历史起点时，额外腾出的预算比例
+        '''
+        self.budgets: Dict[str, int] = dict(budgets or {})
+        self.default_budget = default_budget
+        self.reserve = reserve
+        self.tokenizer: Callable[[str], int] = tokenizer or estimate_tokens
+        self.summarizer = summarizer
+        self.overhead = overhead
+        self.slack = slack
+        self._counts: dict[int, Tuple[dict, int]] = {}
+        self._tools: Tuple[Any, int] = (None, 0)
+        self._summary: Tuple[Any, dict] = (None, None)
+        # 稳定布局下上次保留的第一条历史消息
+        self._anchor: dict = None
+    
+    @staticmethod
+    def tiktoken(model: str) -> Callable[[str], int]:
+        '''
+        获取 tiktoken 分词器，未安装 tiktoken 时返回None
+
+        Args:
+            model: 模型名称，无法识别时使用 o200k_base 编码
+        '''
+        try:
+            import tiktoken
+        except ImportError:
+            return None
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+    
+    def count_message(self, message: dict) -> int:
+        '''计算单条消息的 token 数'''
+        tokens = self.overhead
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += self.tokenizer(content)
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and isinstance(part.get('text'), str):
+                    tokens += self.tokenizer(part['text'])
+        for call in message.get('tool_calls') or ():
+            function = call.get('function') or {}
+            tokens += self.tokenizer(function.get('name') or '')
+            tokens += self.tokenizer(function.get('arguments') or '')
+        if message.get('name'):
+            tokens += self.tokenizer(message['name'])
+        return tokens
+    
+    def count_tools(self, tools: ToolSchema) -> int:
+        '''计算工具列表的 token 数，按 ToolSchema 对象缓存'''
+        if tools is None:
+            return 0
+        if self._tools[0] is not tools:
+            self._tools = (tools, self.tokenizer(tools.payload.decode('utf-8')))
+        return self._tools[1]
+    
+    @staticmethod
+    def group(history: list) -> list[list[dict]]:
+        '''将历史按轮分组，tool 消息归入其前面的消息所在的组'''
+        groups = []
+        for message in history:
+            if groups and message.get('role') == 'tool':
+                groups[-1].append(message)
+            else:
+                groups.append([message])
+        return groups
+    
+    def fit(self, model: str, prefix: list, history: list, suffix: list, tools: ToolSchema=None,
+            stable: bool=False) -> list:
+        '''
+        生成符合预算的消息列表
+
+        Args:
+            model: 模型名称，用于确定预算
+            prefix: 预设提示词消息，总是保留
+            history: 对话历史
+            suffix: 通知消息，总是保留
+            tools: 本次请求的工具列表，其大小计入预算
+            stable: 是否保持历史起点稳定。起点每移动一次，供应商缓存的提示词前缀就全部失效，
+                    因此沿用上次的起点直到放不下，需要移动时一次多裁掉 slack 比例的预算
+
+        Returns:
+            list: prefix + 裁剪后的历史（可能以一条总结消息开头） + suffix
+        '''
+        budget = self.budget_for(model)
+        if budget is None:
+            return prefix + history + suffix
+        
+        # 仅缓存当前历史中消息的计数，已被遗忘的消息随之释放
+        previous = self._counts
+        counts = {}
+        def count(message: dict) -> int:
+            key = id(message)
+            cached = previous.get(key)
+            if cached is None or cached[0] is not message:
+                cached = (message, self.count_message(message))
+            counts[key] = cached
+            return cached[1]
+        
+        available = budget - self.reserve - self.count_tools(tools)
+        available -= sum(count(m) for m in prefix) + sum(count(m) for m in suffix)
+        
+        groups = self.group(history)
+        sizes = [sum(count(m) for m in g) for g in groups]
+        self._counts = counts
+        
+        # 从最新的一组开始向前保留，最新的一组总是保留
+        start = len(groups)
+        used = 0
+        while start > 0 and (start == len(groups) or used + sizes[start - 1] <= available):
+            start -= 1
+            used += sizes[start]
+        if stable:
+            start, used = self._stable_start(groups, sizes, start, used, available)
+        if start == 0:
+            return prefix + history + suffix
+        
+        summary = self._summarize(groups[:start])
+        if summary is not None:
+            used += self.count_message(summary)
+            # 总结消息也要计入预算，放不下时继续丢弃更早的组
+            while used > available and start < len(groups) - 1:
+                used -= sizes[start]
+                start += 1
+        if stable:
+            self._anchor = groups[start][0]
+        
+        kept = [m for g in groups[start:] for m in g]
+        return prefix + ([summary] if summary else []) + kept + suffix
+    
+    def _stable_start(self, groups: list, sizes: list, start: int, used: int, available: int) -> Tuple[int, int]:
+        '''在放得下的前提下沿用上次的起点，否则裁剪到预算的 1 - slack 以内'''
+        anchor = self._anchor
+        for i in range(start, len(groups)):
+            if groups[i][0] is anchor:
+                return i, sum(sizes[i:])
+        target = available * (1 - self.slack) if start else used
+        while used > target and start < len(groups) - 1:
+            used -= sizes[start]
+            start += 1
+        if groups:
+            self._anchor = groups[start][0]
+        return start, used
+    
+    def _summarize(self, dropped: list[list[dict]]) -> dict:
+        if not self.summarizer:
+            return None
+        # 被丢弃的部分不变时复用上一次的总结
+        key = (id(dropped[0][0]), len(dropped), id(dropped[-1][-1]))
+        if self._summary[0] == key:
+            return self._summary[1]
+        messages = [m for g in dropped for m in g]
+        text = self.summarizer(messages)
+        summary = {'role': 'system', 'content': text} if text else None
+        self._summary = (key, summary)
+        return summary
+
+
+# 提示词文件缓存：路径 -> (修改时间, 内容)
+_prompt_files: Dict[str, Tuple[int, str]] = {}
+
+
+def _read_prompt(path: str) -> str:
+    '''读取提示词文件，文件未修改时直接返回缓存的内容'''
+    mtime = os.stat(path).st_mtime_ns
+    cached = _prompt_files.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, req_file(path))
+        _prompt_files[path] = cached
+    return cached[1]
+
+
+def _stable_text(content: Any) -> Any:
+    '''统一换行符、Unicode 规范化形式与行尾空白，使相同的提示词总是得到相同的字节'''
+    if not isinstance(content, str):
+        return content
+    lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return _intern(unicodedata.normalize('NFC', '\n'.join(line.rstrip() for line in lines).strip()))
+
+
+def _cached_tokens(usage: dict) -> int:
+    '''读取 usage 中命中供应商提示词缓存的 token 数，兼容 OpenAI、DeepSeek 与 Anthropic 的字段'''
+    details = usage.get('prompt_tokens_details')
+    if isinstance(details, dict) and details.get('cached_tokens') is not None:
+        return details['cached_tokens']
+    for name in ('prompt_cache_hit_tokens', 'cache_read_input_tokens'):
+        if usage.get(name) is not None:
+            return usage[name]
+    return None
+
+
+# tokens_per_second 直方图的分桶
+_TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000)
 
 
 class Mind:
-    def __init__(self, model:str|Endpoint, key:str=None, endpoint:str=None, identify:Identify=None):
+    # 客户端注册表，可在子类或实例上替换为独立的注册表
+    clients: ClientRegistry = client_registry
+    # 指标注册表，默认使用全局注册表
+    metrics: Metrics = default_metrics
+
+    def __init__(self, model:str|Endpoint|List[Endpoint]|EndpointPool, key:str=None, endpoint:str=None, identify:Identify=None, max_rounds:int=32,
+                 store:MemoryStore=None, session_id:str=None):
         self.model: str = None
         self.idf: Identify = identify or Identify()
-        import openai
-        self._ai: openai.OpenAI = None
+        self._ai = None
+        # 多端点池，设置后每次请求按策略选择端点并在失败时转移
+        self.endpoints: EndpointPool = None
 
-        if isinstance(model, Endpoint):
+        if isinstance(model, (list, tuple, EndpointPool)):
+            self.set_endpoints(model)
+        elif isinstance(model, Endpoint):
             self.reload_endpoint(model)
         else:
             self.set_model(model)
             os.environ['OPENAI_API_KEY'] = key
-            self._ai = openai.OpenAI(
-                api_key  = key,
-                base_url = endpoint
-            )
+            self._ai = self._create_client(key, endpoint)
 
-        self._memories: list[dict] = []
+        # 持久化后端，设置后历史在首次访问 _memories 时才从中加载
+        self._store: MemoryStore = None
+        self.session_id: str = None
+        self.__memories: list[dict] = []
+        if store is not None:
+            self.load_session(store, session_id)
 
         self._predefined: List[Tuple[str, str]] = []
         self._notice: List[Tuple[str, str]] = []
+
+        # 按 token 预算裁剪请求中的历史，为None时发送完整历史
+        self.context_window: ContextWindow = None
+
+        # 确定性请求（temperature=0）的响应缓存，为None时不缓存
+        self.response_cache: ResponseCache = None
+
+        # 流式请求的首 token 超时（秒），超时后发起对冲请求；hedges 记录对冲次数与对冲胜出次数
+        self.ttft: float = None
+        self.hedges: Dict[str, int] = {'fired': 0, 'won': 0}
+
+        # 按对话内容挑选每次请求携带的工具，为None时携带全部工具
+        self.tool_router: ToolRouter = None
+
+        # 流式请求中，工具调用的参数接收完整后立即执行，不等待整个响应结束
+        self.dispatch_early: bool = False
+
+        # 保持请求前缀稳定，提高供应商提示词缓存的命中率：预设提示词按字节规范化，工具按名称排序，
+        # context_window 裁剪时尽量不移动历史起点；每轮的 cached_tokens 记录在 rounds 中
+        self.prefix_stable: bool = False
+        self._stable_view: bool = False
+
+        # build_memory 的缓存：预设提示词前缀、通知后缀，以及拼接好的完整列表
+        self._prefix: Tuple[tuple, list] = (None, [])
+        self._suffix: Tuple[tuple, list] = (None, [])
+        self._view: list = []
+        self._view_state: tuple = None
         
         self.on_preparing_call: Callable = None
+        self.on_round_call: Callable = None
+
+        # 单次 request 中模型请求的最大轮数，最后一轮禁止继续调用工具
+        self.max_rounds: int = max_rounds
 
     def tool(self) -> Callable:
         return self.idf.identify
@@ -548,17 +2273,67 @@ class Mind:
             return func
         return decorator
     
+    def on_round(self) -> Callable:
+        '''每轮模型请求（及其工具调用）结束后回调，参数为该轮的计时信息'''
+        def decorator(func: Callable) -> Callable:
+            self.on_round_call = func
+            return func
+        return decorator
+    
     def set_model(self, model:str):
         self.model = model
     
     def reload_endpoint(self, endpoint:Endpoint) -> None:
-        import openai
         self.set_model(endpoint.model)
         os.environ['OPENAI_API_KEY'] = endpoint.key
-        self._ai = openai.OpenAI(
-            api_key  = endpoint.key,
-            base_url = endpoint.endpoint
-        )
+        self._ai = self._create_client(endpoint.key, endpoint.endpoint)
+        self.endpoints = None
+    
+    def set_endpoints(self, endpoints:List[Endpoint]|EndpointPool) -> None:
+        '''
+        使用多个端点，之后的请求按 EndpointPool 的策略分配并自动故障转移
+
+        切换端点不影响已有的对话历史
+        '''
+        if not isinstance(endpoints, EndpointPool):
+            endpoints = EndpointPool(endpoints)
+        self.endpoints = endpoints
+        primary = endpoints.endpoints[0]
+        self.set_model(primary.model)
+        self._ai = self._create_client(primary.key, primary.endpoint)
+    
+    def _create_client(self, key:str, endpoint:str):
+        return self.clients.get(key, endpoint)
+    
+    @property
+    def _memories(self) -> list[dict]:
+        if self.__memories is None:
+            self.__memories = [compact_message(m) for m in self._store.load(self.session_id)]
+        return self.__memories
+    
+    @_memories.setter
+    def _memories(self, value: list[dict]) -> None:
+        self.__memories = value
+    
+    def load_session(self, store:MemoryStore, session_id:str) -> None:
+        '''
+        绑定持久化后端与会话ID
+
+        会话的历史在第一次需要时才加载；之后新增的消息会追加写入后端
+        '''
+        if not session_id:
+            raise ValueError("会话ID不能为空")
+        self._store = store
+        self.session_id = session_id
+        self.__memories = None
+        self.refresh_memory()
+    
+    def _remember(self, *messages: dict) -> None:
+        '''将消息压缩后追加到历史，并写入持久化后端'''
+        messages = [compact_message(m) for m in messages]
+        self._memories.extend(messages)
+        if self._store is not None:
+            self._store.append(self.session_id, messages)
     
     def add_content(self, role:str, content:str|list[dict[str, Any]], **kwargs):
         data = {
@@ -566,7 +2341,7 @@ class Mind:
             "content": content,
         }
         data.update(kwargs)
-        self._memories.append(data)
+        self._remember(data)
     
     def check_content(self, role:str, content:str):
         if not content: return None
@@ -577,122 +2352,562 @@ class Mind:
     
     def reset_predefined(self, data:List[Tuple[str, str]]):
         self._predefined = data
+        self.refresh_memory()
 
     def add_predefined_prompt(self, role:str,  content:str):
         if os.path.isfile(content):
-            content = req_file(content)
-        self._predefined.append((role, content))
+            content = _read_prompt(content)
+        # 驻留提示词文本，多个会话使用相同的人设时共用同一个字符串
+        self._predefined.append((_intern(role), _intern(content)))
+        self.refresh_memory()
+    
+    def reset_notice(self, data:List[Tuple[str, str]]):
+        self._notice = data
+        self.refresh_memory()
+    
+    def add_notice(self, role:str, content:str):
+        '''添加一条通知，通知总是位于历史之后'''
+        self._notice.append((_intern(role), _intern(content)))
+        self.refresh_memory()
+    
+    def refresh_memory(self) -> None:
+        '''
+        使 build_memory 的缓存失效
+
+        通过方法修改预设提示词、通知和历史时会自动调用；
+        直接替换 _memories 中已有的元素，或原地修改预设提示词、通知的内容对象后需要手动调用
+        '''
+        self._prefix = (None, [])
+        self._suffix = (None, [])
+        self._view_state = None
     
     @property
     def functions(self) -> list[str]:
         return self.idf.req_info()
     
-    @property
-    def build_memory(self) -> list:
+    def set_context_window(self, window: ContextWindow) -> None:
+        self.context_window = window
+    
+    def _build_messages(self, items: List[Tuple[str, str]], cached: tuple) -> tuple:
+        # 与上次生成时的快照逐项相等时复用已生成的消息，原地替换元素也能察觉
+        snapshot = tuple(items)
+        if cached[0] == snapshot:
+            return cached
         new = []
-        for i in self._predefined:
-            pre = self.check_content(i[0], i[1])
-            if pre: new.append(pre)
-        new.extend(self._memories)
-        for i in self._notice:
-            pre = self.check_content(i[0], i[1])
+        for role, content in items:
+            if self._stable_view:
+                content = _stable_text(content)
+            pre = self.check_content(role, content)
             if pre: new.append(pre)
-        return new
-    
-    def __request_block(self, **kwargs):
-        response = self._ai.chat.completions.create(
-            model       = self.model,
-            messages    = self.build_memory,
-            tools       = self.idf.req_info(strict=True),
-            tool_choice = "auto",
-            **kwargs
-        )
-        original_data = to_dict_recursive(response.choices[0])
-        data = original_data['message']
-        self._memories.append(to_dict_recursive(data))
-        if original_data.get('reasoning_content'):
-            reason = [original_data['reasoning_content']]
+        return (snapshot, new)
+    
+    @property
+    def build_memory(self) -> list:
+        '''
+        生成发送给模型的完整消息列表
+
+        返回的列表在多次调用间复用，只追加新增的历史，调用方不应修改它
+        '''
+        if not self.metrics.enabled:
+            return self._build_memory()
+        started = time.perf_counter()
+        memory = self._build_memory()
+        self.metrics.observe('build_memory_seconds', time.perf_counter() - started)
+        return memory
+    
+    def _build_memory(self) -> list:
+        if self._stable_view != self.prefix_stable:
+            self._stable_view = self.prefix_stable
+            self.refresh_memory()
+        self._prefix = self._build_messages(self._predefined, self._prefix)
+        self._suffix = self._build_messages(self._notice, self._suffix)
+        prefix = self._prefix[1]
+        suffix = self._suffix[1]
+        memories = self._memories
+        if self.context_window:
+            return self.context_window.fit(
+                self.model, prefix, memories, suffix,
+                tools=self._select_tools(),
+                stable=self._stable_view,
+            )
+        
+        view = self._view
+        state = self._view_state
+        if (state and state[0] is prefix and state[1] is suffix and state[2] is memories
+                and state[3] <= len(memories)
+                and (state[3] == 0 or memories[state[3] - 1] is state[4])):
+            # 历史只在末尾追加：移除旧的后缀，追加新消息后再放回后缀
+            if suffix:
+                del view[len(view) - len(suffix):]
+            view.extend(memories[state[3]:])
+            view.extend(suffix)
         else:
-            reason = []
-        content = [data['content']]
-        if data['tool_calls']:
-            results = self.idf.calls(data['tool_calls'])
-            self._memories.extend(results)
-            temp = self.__request_block()
-            reason.extend(temp['reasoning'])
-            content.extend(temp['content'])
+            view = prefix + memories + suffix
+            self._view = view
+        self._view_state = (prefix, suffix, memories, len(memories), memories[-1] if memories else None)
+        return view
+    
+    def _completion_args(self, index:int, kwargs:dict) -> dict:
+        '''
+        生成第 index 轮请求的参数，调用方的采样参数在每一轮都会保留
+
+        达到 max_rounds 的最后一轮使用 tool_choice="none"，要求模型直接给出回答
+        '''
+        args = {
+            'model'      : self.model,
+            'messages'   : self.build_memory,
+        }
+        tools = self._select_tools().tools
+        if tools:
+            args['tools'] = tools
+            args['tool_choice'] = "none" if index >= self.max_rounds - 1 else "auto"
+        args.update(kwargs)
+        if args.get('stream') and (self.prefix_stable or self.metrics.enabled and self.metrics.stream_usage):
+            # 要求服务端在流的最后一块返回 usage，用于统计 token 与缓存命中
+            args.setdefault('stream_options', {'include_usage': True})
+        return args
+    
+    def _select_tools(self) -> ToolSchema:
+        '''本轮请求携带的工具，设置了 tool_router 时只包含与当前对话相关的工具'''
+        schema = self.idf.req_tools(strict=True, ordered=self.prefix_stable)
+        if self.tool_router is None:
+            return schema
+        return self.tool_router.select(schema, self._memories)
+    
+    def _use_cache(self, cache:bool, kwargs:dict) -> bool:
+        '''cache 为None时，仅对 temperature=0 的请求使用缓存'''
+        if self.response_cache is None:
+            return False
+        if cache is not None:
+            return cache
+        return kwargs.get('temperature') == 0
+    
+    def _cache_key(self, args:dict) -> str:
+        tools = args.get('tools')
+        schema = self._select_tools()
+        if tools is schema.tools:
+            payload = schema.payload
+        else:
+            payload = json.dumps(tools, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return self.response_cache.key({k: v for k, v in args.items() if k != 'tools'}, payload)
+    
+    def _open(self, args:dict, cache:bool=False, ttft:float=None):
+        '''
+        发起一次模型请求
+
+        启用缓存时优先回放已缓存的响应；流式响应在完整读取后才写入缓存。
+        流式请求设置了 ttft 时，首 token 超时后会发起对冲请求
+        '''
+        if not cache:
+            return self._send(args, ttft)
+        key = self._cache_key(args)
+        record = self.response_cache.get(key)
+        if record is not None:
+            return self.response_cache.replay(record)
+        response = self._send(args, ttft)
+        if args.get('stream'):
+            return self._record_stream(key, response)
+        self.response_cache.put(key, {'stream': False, 'response': to_dict_recursive(response)})
+        return response
+    
+    def _send(self, args:dict, ttft:float=None):
+        if ttft and args.get('stream'):
+            return _HedgedStream(lambda: self._dispatch(args), ttft, self.hedges)
+        return self._dispatch(args)
+    
+    def _dispatch(self, args:dict):
+        '''
+        将请求发送到端点
+
+        使用 EndpointPool 时按策略依次尝试端点，遇到可重试的错误时转移到下一个端点；
+        流式请求只在建立连接阶段转移，开始返回数据后出错会直接抛出
+        '''
+        if self.endpoints is None:
+            return self._ai.chat.completions.create(**args)
+        pool = self.endpoints
+        order = pool.order()
+        for attempt, index in enumerate(order):
+            endpoint = pool.endpoints[index]
+            client = self._create_client(endpoint.key, endpoint.endpoint)
+            pool.acquire(index)
+            started = time.perf_counter()
+            try:
+                response = client.chat.completions.create(**dict(args, model=endpoint.model))
+            except Exception as e:
+                pool.release(index, error=e)
+                if not pool.is_retryable(e) or attempt == len(order) - 1:
+                    raise
+                continue
+            self.model = endpoint.model
+            self._ai = client
+            if args.get('stream'):
+                return _PooledStream(pool, index, started, response)
+            pool.release(index, latency=time.perf_counter() - started)
+            return response
+    
+    def _record_stream(self, key:str, response):
+        chunks = []
+        for chunk in response:
+            chunks.append(to_dict_recursive(chunk))
+            yield chunk
+        self.response_cache.put(key, {'stream': True, 'chunks': chunks})
+    
+    def _dispatcher(self, dispatched:dict, submit:Callable) -> Callable:
+        '''生成 _StreamBuffer 的 on_ready 回调，未开启 dispatch_early 时返回None'''
+        if not self.dispatch_early:
+            return None
+        def on_ready(index:int, call:dict) -> None:
+            dispatched[index] = submit(call)
+        return on_ready
+    
+    def _preparing(self, name:str) -> None:
+        try:
+            self.on_preparing_call(name)
+        except: self.metrics.hook_error('on_preparing')
+    
+    def _report_round(self, index:int, started:float, responded:float, tool_calls:int,
+                      mode:str='block', first:float=None, usage:Any=None) -> dict:
+        '''
+        生成并回调一轮请求的计时信息（秒）
+
+        Args:
+            index: 轮次
+            started: 请求开始时间
+            responded: 模型响应完成时间
+            tool_calls: 本轮工具调用数量
+            mode: block 或 stream
+            first: 流式请求首个输出到达的时间
+            usage: 响应中的 usage
+        '''
+        finished = time.perf_counter()
+        info = {
+            'round'     : index,
+            'request'   : responded - started,
+            'tools'     : finished - responded,
+            'elapsed'   : finished - started,
+            'tool_calls': tool_calls,
+        }
+        if first is not None:
+            info['ttft'] = first - started
+        if usage is not None:
+            info['usage'] = to_dict_recursive(usage)
+            cached = _cached_tokens(info['usage'])
+            if cached is not None:
+                info['cached_tokens'] = cached
+        if self.metrics.enabled:
+            self._observe_round(info, mode, started, responded)
+        if self.on_round_call:
+            try:
+                self.on_round_call(info)
+            except: self.metrics.hook_error('on_round')
+        return info
+    
+    def _observe_round(self, info:dict, mode:str, started:float, responded:float) -> None:
+        metrics = self.metrics
+        model = self.model
+        metrics.inc('requests', model=model, mode=mode)
+        metrics.observe('request_seconds', info['request'], model=model, mode=mode)
+        if 'ttft' in info:
+            metrics.observe('ttft_seconds', info['ttft'], model=model)
+        usage = info.get('usage') or {}
+        prompt = usage.get('prompt_tokens')
+        completion = usage.get('completion_tokens')
+        if prompt:
+            metrics.inc('prompt_tokens', prompt, model=model)
+        if info.get('cached_tokens'):
+            metrics.inc('cached_tokens', info['cached_tokens'], model=model)
+        if completion:
+            metrics.inc('completion_tokens', completion, model=model)
+            # 流式请求从首个输出开始计算生成速度
+            generating = info['request'] - info.get('ttft', 0)
+            if generating > 0:
+                metrics.observe('tokens_per_second', completion / generating, buckets=_TOKEN_RATE_BUCKETS, model=model)
+        metrics.record_span(
+            'mind.request', started, responded,
+            model=model, mode=mode, round=info['round'],
+            prompt_tokens=prompt, completion_tokens=completion,
+        )
+    
+    def __request_block(self, cache:bool=False, **kwargs):
+        reason = []
+        content = []
+        rounds = []
+        for index in range(self.max_rounds):
+            started = time.perf_counter()
+            response = self._open(self._completion_args(index, kwargs), cache)
+            responded = time.perf_counter()
+            
+            original_data = to_dict_recursive(response.choices[0])
+            data = original_data['message']
+            self._remember(data)
+            reasoning_content = data.get('reasoning_content') or original_data.get('reasoning_content')
+            if reasoning_content:
+                reason.append(reasoning_content)
+            content.append(data['content'])
+            
+            results = self.idf.calls(data['tool_calls']) if data.get('tool_calls') else []
+            self._remember(*results)
+            rounds.append(self._report_round(index, started, responded, len(results),
+                                             usage=getattr(response, 'usage', None)))
+            if not results:
+                break
         return {
             'type': 'block',
             'reasoning': reason,
-            'content': content
+            'content': content,
+            'rounds': rounds
         }
     
-    def __request_stream(self, reasoning:bool=True, **kwargs):
-        response = self._ai.chat.completions.create(
-            model       = self.model,
-            messages    = self.build_memory,
-            tools       = self.idf.req_info(strict=True),
-            tool_choice = "auto",
-            stream      = True,
-            **kwargs
-        )
-        tool_calls = []
-        content = ''
-        for chunk in response:
-            if not chunk.choices: continue
-            if not chunk.choices[0].delta:continue
-            delta = to_dict_recursive(chunk.choices[0].delta)
+    def __request_stream(self, reasoning:bool=True, cache:bool=False, ttft:float=None, **kwargs):
+        for index in range(self.max_rounds):
+            started = time.perf_counter()
+            response = self._open(self._completion_args(index, dict(kwargs, stream=True)), cache, ttft)
+            dispatched = {}
+            buffer = _StreamBuffer(
+                reasoning = reasoning,
+                on_name   = self._preparing if self.on_preparing_call else None,
+                on_ready  = self._dispatcher(dispatched, self.idf.submit),
+            )
+            try:
+                for chunk in response:
+                    choices = chunk.choices
+                    if not choices:
+                        # 开启 include_usage 时，最后一块只包含 usage
+                        buffer.usage = getattr(chunk, 'usage', None) or buffer.usage
+                        continue
+                    delta = choices[0].delta
+                    if not delta: continue
+                    for event in buffer.feed(delta):
+                        yield event
+            except BaseException:
+                for future in dispatched.values():
+                    future.cancel()
+                raise
+            buffer.finish()
+            responded = time.perf_counter()
+            content = buffer.text
+            tool_calls = buffer.tool_calls
             
-            if delta.get('reasoning_content') and reasoning == True:
-                yield {
-                    'type': 'reasoning_content',
-                    'content': delta['reasoning_content']
-                }
+            if not tool_calls:
+                self.add_content('assistant', content)
+                self._report_round(index, started, responded, 0, 'stream', buffer.first, buffer.usage)
+                return
             
-            if delta.get('content'):
-                content += delta['content']
-                yield {
-                    'type': 'content',
-                    'content': delta['content']
-                }
-                
-            if delta.get('tool_calls'):
-                tcchunklist = delta['tool_calls']
-                for tcchunk in tcchunklist:
-                    if len(tool_calls) <= tcchunk['index']:
-                        tool_calls.append({'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}})
-                    tc = tool_calls[tcchunk['index']]
-                    
-                    if tcchunk['id']:
-                        tc['id'] += tcchunk['id']
-                    if tcchunk['function']['name']:
-                        if self.on_preparing_call:
-                            try:
-                                self.on_preparing_call(tcchunk['function']['name'])
-                            except: pass
-                        tc['function']['name'] += tcchunk['function']['name']
-                    if tcchunk['function']['arguments']:
-                        tc['function']['arguments'] += tcchunk['function']['arguments']
-        
-
-        if tool_calls:
             self.add_content('assistant', content, tool_calls=tool_calls)
-            results = self.idf.calls(tool_calls)
-            self._memories.extend(results)
-            yield from self.__request_stream(reasoning=reasoning)
-        else:
-            self.add_content('assistant', content)
+            results = self.idf.calls(tool_calls, dispatched=dispatched)
+            self._remember(*results)
+            self._report_round(index, started, responded, len(results), 'stream', buffer.first, buffer.usage)
 
     
-    def request(self, stream:bool=False, reasoning:bool=True, **kwargs) -> Union[dict, Any]:
+    def request(self, stream:bool=False, reasoning:bool=True, cache:bool=None, ttft:float=None, **kwargs) -> Union[dict, Any]:
+        '''
+        发起请求
+
+        Args:
+            stream: 是否流式返回
+            reasoning: 流式模式下是否输出 reasoning_content
+            cache: 是否使用 response_cache，为None时仅缓存 temperature=0 的请求
+            ttft: 流式模式下的首 token 超时（秒），超时后发起对冲请求，为None时使用 self.ttft
+            **kwargs: 传给 chat.completions.create 的其他参数
+        '''
+        cache = self._use_cache(cache, kwargs)
         if stream:
-            return self.__request_stream(reasoning=reasoning, **kwargs)
+            return self.__request_stream(reasoning=reasoning, cache=cache, ttft=ttft or self.ttft, **kwargs)
         else:
-            return self.__request_block(**kwargs)
+            return self.__request_block(cache=cache, **kwargs)
     
     def forget_all(self):
         self._memories = []
+        if self._store is not None:
+            self._store.clear(self.session_id)
+        self.refresh_memory()
     
     def forget_last(self):
         self._memories.pop()
-        self._memories.pop()
\ No newline at end of file
+        self._memories.pop()
+        if self._store is not None:
+            self._store.truncate(self.session_id, 2)
+        self.refresh_memory()
+
+
+class _AsyncClient:
+    '''
+    AsyncMind 持有的客户端引用
+
+    异步客户端不能跨事件循环使用，每次访问时从注册表取当前事件循环对应的客户端，
+    同一个 AsyncMind 可以在多次 asyncio.run 中使用
+    '''
+    __slots__ = ('registry', 'key', 'endpoint')
+
+    def __init__(self, registry: ClientRegistry, key: str, endpoint: str) -> None:
+        self.registry = registry
+        self.key = key
+        self.endpoint = endpoint
+
+    @property
+    def chat(self) -> Any:
+        return self.registry.get(self.key, self.endpoint, asynchronous=True).chat
+
+
+class AsyncMind(Mind):
+    '''
+    基于 openai.AsyncOpenAI 的异步 Mind
+
+    用法与 Mind 相同，区别在于:
+        await mind.request() 返回完整结果
+        async for chunk in mind.request(stream=True) 逐块获取流式结果
+    工具调用通过 Identify.acalls 并发执行，异步工具函数会被直接等待
+    '''
+    def _create_client(self, key:str, endpoint:str):
+        return _AsyncClient(self.clients, key, endpoint)
+    
+    async def _aload_mcp(self) -> None:
+        '''在线程中获取延迟注册的MCP工具列表，避免阻塞事件循环'''
+        if self.idf._mcp_due():
+            await asyncio.to_thread(self.idf.load_mcp)
+    
+    async def _aopen(self, args:dict, cache:bool=False, ttft:float=None):
+        '''_open 的异步版本'''
+        if not cache:
+            return await self._asend(args, ttft)
+        key = self._cache_key(args)
+        record = self.response_cache.get(key)
+        if record is not None:
+            replay = self.response_cache.replay(record)
+            return self._areplay(replay) if args.get('stream') else replay
+        response = await self._asend(args, ttft)
+        if args.get('stream'):
+            return self._arecord_stream(key, response)
+        self.response_cache.put(key, {'stream': False, 'response': to_dict_recursive(response)})
+        return response
+    
+    async def _asend(self, args:dict, ttft:float=None):
+        if ttft and args.get('stream'):
+            return _ahedged_stream(lambda: self._adispatch(args), ttft, self.hedges)
+        return await self._adispatch(args)
+    
+    async def _adispatch(self, args:dict):
+        '''_dispatch 的异步版本'''
+        if self.endpoints is None:
+            return await self._ai.chat.completions.create(**args)
+        pool = self.endpoints
+        order = pool.order()
+        for attempt, index in enumerate(order):
+            endpoint = pool.endpoints[index]
+            client = self._create_client(endpoint.key, endpoint.endpoint)
+            pool.acquire(index)
+            started = time.perf_counter()
+            try:
+                response = await client.chat.completions.create(**dict(args, model=endpoint.model))
+            except Exception as e:
+                pool.release(index, error=e)
+                if not pool.is_retryable(e) or attempt == len(order) - 1:
+                    raise
+                continue
+            except BaseException:
+                # 对冲请求落败等情况下，任务在等待响应时被取消（CancelledError 不是 Exception）
+                pool.abandon(index)
+                raise
+            self.model = endpoint.model
+            self._ai = client
+            if args.get('stream'):
+                return _APooledStream(pool, index, started, response)
+            pool.release(index, latency=time.perf_counter() - started)
+            return response
+    
+    async def _areplay(self, chunks:list):
+        for chunk in chunks:
+            yield chunk
+    
+    async def _arecord_stream(self, key:str, response):
+        chunks = []
+        async for chunk in response:
+            chunks.append(to_dict_recursive(chunk))
+            yield chunk
+        self.response_cache.put(key, {'stream': True, 'chunks': chunks})
+    
+    async def __request_block(self, cache:bool=False, **kwargs):
+        reason = []
+        content = []
+        rounds = []
+        for index in range(self.max_rounds):
+            started = time.perf_counter()
+            await self._aload_mcp()
+            response = await self._aopen(self._completion_args(index, kwargs), cache)
+            responded = time.perf_counter()
+            
+            original_data = to_dict_recursive(response.choices[0])
+            data = original_data['message']
+            self._remember(data)
+            reasoning_content = data.get('reasoning_content') or original_data.get('reasoning_content')
+            if reasoning_content:
+                reason.append(reasoning_content)
+            content.append(data['content'])
+            
+            results = await self.idf.acalls(data['tool_calls']) if data.get('tool_calls') else []
+            self._remember(*results)
+            rounds.append(self._report_round(index, started, responded, len(results),
+                                             usage=getattr(response, 'usage', None)))
+            if not results:
+                break
+        return {
+            'type': 'block',
+            'reasoning': reason,
+            'content': content,
+            'rounds': rounds
+        }
+    
+    async def __request_stream(self, reasoning:bool=True, cache:bool=False, ttft:float=None, **kwargs):
+        for index in range(self.max_rounds):
+            started = time.perf_counter()
+            await self._aload_mcp()
+            response = await self._aopen(self._completion_args(index, dict(kwargs, stream=True)), cache, ttft)
+            dispatched = {}
+            buffer = _StreamBuffer(
+                reasoning = reasoning,
+                on_name   = self._preparing if self.on_preparing_call else None,
+                on_ready  = self._dispatcher(dispatched, self.idf.asubmit),
+            )
+            try:
+                async for chunk in response:
+                    choices = chunk.choices
+                    if not choices:
+                        # 开启 include_usage 时，最后一块只包含 usage
+                        buffer.usage = getattr(chunk, 'usage', None) or buffer.usage
+                        continue
+                    delta = choices[0].delta
+                    if not delta: continue
+                    for event in buffer.feed(delta):
+                        yield event
+            except BaseException:
+                for task in dispatched.values():
+                    task.cancel()
+                raise
+            buffer.finish()
+            responded = time.perf_counter()
+            content = buffer.text
+            tool_calls = buffer.tool_calls
+            
+            if not tool_calls:
+                self.add_content('assistant', content)
+                self._report_round(index, started, responded, 0, 'stream', buffer.first, buffer.usage)
+                return
+            
+            self.add_content('assistant', content, tool_calls=tool_calls)
+            results = await self.idf.acalls(tool_calls, dispatched=dispatched)
+            self._remember(*results)
+            self._report_round(index, started, responded, len(results), 'stream', buffer.first, buffer.usage)
+    
+    def request(self, stream:bool=False, reasoning:bool=True, cache:bool=None, ttft:float=None, **kwargs) -> Any:
+        '''
+        发起请求，参数与 Mind.request 相同
+
+        Returns:
+            stream 为 False 时返回可等待的协程，结果与 Mind.request 相同；
+            stream 为 True 时返回异步生成器
+        '''
+        cache = self._use_cache(cache, kwargs)
+        if stream:
+            return self.__request_stream(reasoning=reasoning, cache=cache, ttft=ttft or self.ttft, **kwargs)
+        else:
+            return self.__request_block(cache=cache, **kwargs)
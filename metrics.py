@@ -0,0 +1,173 @@
+from typing import Any, Dict, List, Tuple
+import threading
+import time
+
+
+# 默认的直方图分桶（秒）
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    '''
+    进程内的指标注册表
+
+    记录计数器与直方图，可导出为 Prometheus 文本格式，或通过 OpenTelemetry 输出 span。
+    默认关闭，关闭时各埋点只做一次布尔判断
+    '''
+    def __init__(self, enabled: bool=False, prefix: str='mind', buckets: Tuple[float, ...]=DEFAULT_BUCKETS) -> None:
+        '''
+        Args:
+            enabled: 是否启用
+            prefix: 导出时指标名称的前缀
+            buckets: 直方图分桶
+        '''
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        # 流式请求时是否要求服务端在最后一块返回 usage（stream_options.include_usage）
+        self.stream_usage = True
+        self.tracer = None
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, _Histogram]] = {}
+
+    def enable(self, enabled: bool=True) -> 'Metrics':
+        self.enabled = enabled
+        return self
+
+    def use_opentelemetry(self, tracer: Any=None) -> 'Metrics':
+        '''
+        通过 OpenTelemetry 输出 span
+
+        Args:
+            tracer: OpenTelemetry Tracer，为None时使用全局 TracerProvider 创建
+        '''
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer(self.prefix)
+        self.tracer = tracer
+        return self
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name: str, value: float=1, **labels) -> None:
+        '''计数器加 value'''
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...]=None, **labels) -> None:
+        '''
+        向直方图记录一个样本
+
+        Args:
+            name: 指标名称
+            value: 样本值
+            buckets: 该指标首次出现时使用的分桶，为None时使用默认分桶
+        '''
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(tuple(sorted(buckets)) if buckets else self.buckets)
+            histogram.observe(value)
+
+    def hook_error(self, hook: str) -> None:
+        '''记录回调函数抛出的异常（异常本身仍被忽略）'''
+        if self.enabled:
+            self.inc('hook_errors', hook=hook)
+
+    def record_span(self, name: str, started: float, finished: float, **attributes) -> None:
+        '''
+        补记一个已结束的 span
+
+        Args:
+            name: span 名称
+            started: 开始时间（time.perf_counter）
+            finished: 结束时间（time.perf_counter）
+        '''
+        if self.tracer is None:
+            return
+        offset = time.time_ns() - time.perf_counter_ns()
+        span = self.tracer.start_span(
+            name,
+            start_time = offset + int(started * 1e9),
+            attributes = {k: v for k, v in attributes.items() if v is not None},
+        )
+        span.end(end_time=offset + int(finished * 1e9))
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        '''返回当前所有指标的副本'''
+        with self._lock:
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [{'labels': dict(key), 'count': h.count, 'sum': h.sum} for key, h in series.items()]
+                for name, series in self._histograms.items()
+            }
+        return {'counters': counters, 'histograms': histograms}
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple=()) -> str:
+        items = labels + extra
+        if not items:
+            return ''
+        escaped = (
+            (k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items
+        )
+        return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+    def export_prometheus(self) -> str:
+        '''导出为 Prometheus 文本格式'''
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f'{self.prefix}_{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                for key, value in series.items():
+                    lines.append(f'{metric}{self._format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{self._format_labels(key, (("le", repr(float(bound))),))} {cumulative}')
+                    lines.append(f'{metric}_bucket{self._format_labels(key, (("le", "+Inf"),))} {h.count}')
+                    lines.append(f'{metric}_sum{self._format_labels(key)} {h.sum}')
+                    lines.append(f'{metric}_count{self._format_labels(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# 默认的全局指标注册表，默认关闭
+metrics = Metrics()
@@ -0,0 +1,305 @@
+'''
+本地的 OpenAI 兼容模拟服务，用于离线基准测试
+
+用法:
+    with MockServer(latency=0.05, token_rate=500, tool_calls=2) as server:
+        mind = Mind('mock', 'sk-mock', server.url)
+        ...
+
+    python -m <package>.mockserver --port 8000 --tool-calls 2
+'''
+from typing      import Any, Dict, List, Tuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import deque
+import threading
+import argparse
+import random
+import json
+import time
+
+
+# 按参数类型生成的示例值
+_SAMPLE_VALUES = {'string': 'x', 'integer': 1, 'number': 1.0, 'boolean': True, 'array': [], 'object': {}}
+
+
+def common_prefix(a: str, b: str) -> int:
+    '''两个字符串公共前缀的长度，按二分比较切片'''
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _sample_arguments(tool: Dict[str, Any]) -> str:
+    properties = (tool.get('function', {}).get('parameters') or {}).get('properties') or {}
+    arguments = {}
+    for name, info in properties.items():
+        kind = info.get('type') if isinstance(info, dict) else None
+        if isinstance(kind, list):
+            kind = next((k for k in kind if k != 'null'), 'string')
+        arguments[name] = _SAMPLE_VALUES.get(kind, 'x')
+    return json.dumps(arguments)
+
+
+class MockServer:
+    '''
+    OpenAI 兼容的 /chat/completions 模拟服务
+
+    最后一条消息不是工具结果且请求带有 tools 时，返回 tool_calls 个工具调用（依次选取请求中的工具），
+    否则返回 tokens 个 token 的正文。流式响应中工具参数按 fragment 个字符切分，模拟真实的参数片段。
+    设置 prompt_cache 时，以工具列表与消息的 JSON 文本模拟供应商的提示词缓存：与最近请求相同的前缀计为
+    cached_tokens，只有其余部分按 prefill_rate 计入首 token 延迟
+    '''
+    def __init__(self,
+                 host: str='127.0.0.1',
+                 port: int=0,
+                 latency: float=0.0,
+                 token_rate: float=0,
+                 tokens: int=32,
+                 tool_calls: int=0,
+                 fragment: int=8,
+                 error_rate: float=0.0,
+                 error_status: int=500,
+                 prefill_rate: float=0,
+                 prompt_cache: int=0,
+                 seed: int=None) -> None:
+        '''
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时自动选择
+            latency: 首 token 前的延迟（秒）
+            token_rate: 每秒生成的 token 数，为0时不限速
+            tokens: 每次回答的 token 数
+            tool_calls: 每轮返回的工具调用数量
+            fragment: 流式工具参数每个片段的字符数
+            error_rate: 返回错误的概率
+            error_status: 返回错误时的状态码
+            prefill_rate: 每秒处理的未缓存提示词 token 数，为0时不计入延迟
+            prompt_cache: 用于前缀匹配的最近请求数量，为0时不模拟提示词缓存
+            seed: 随机数种子
+        '''
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.tool_calls = tool_calls
+        self.fragment = max(fragment, 1)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.prefill_rate = prefill_rate
+        self._prompts: deque = deque(maxlen=max(prompt_cache, 1))
+        self._prompt_cache = prompt_cache
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        '''可直接作为 Mind 的 endpoint 使用的地址'''
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def _prefill(self, body: Dict[str, Any]) -> Tuple[int, int]:
+        '''返回 (prompt_tokens, cached_tokens)，按每 4 个字符一个 token 估算'''
+        prompt = json.dumps([body.get('tools'), body.get('messages')], ensure_ascii=False)
+        cached = 0
+        if self._prompt_cache:
+            with self._lock:
+                recent = list(self._prompts)
+                self._prompts.append(prompt)
+            cached = max((common_prefix(prompt, p) for p in recent), default=0) // 4
+        return len(prompt) // 4, cached
+
+    def _reply(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        '''按请求决定返回正文还是工具调用'''
+        messages = body.get('messages') or []
+        tools = body.get('tools') or []
+        last = messages[-1].get('role') if messages else None
+        if tools and self.tool_calls and last != 'tool' and body.get('tool_choice') != 'none':
+            calls = []
+            for i in range(self.tool_calls):
+                tool = tools[i % len(tools)]
+                calls.append({
+                    'id': f'call_{i}',
+                    'type': 'function',
+                    'function': {'name': tool['function']['name'], 'arguments': _sample_arguments(tool)},
+                })
+            return {'content': None, 'tool_calls': calls, 'tokens': []}
+        return {'content': None, 'tool_calls': None, 'tokens': [f'tok{i} ' for i in range(self.tokens)]}
+
+    def _usage(self, reply: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = reply['prompt_tokens']
+        completion = len(reply['tokens']) or 8 * len(reply['tool_calls'] or ())
+        return {
+            'prompt_tokens': prompt,
+            'completion_tokens': completion,
+            'total_tokens': prompt + completion,
+            'prompt_tokens_details': {'cached_tokens': reply['cached_tokens']},
+        }
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 逐块写出的小包不等待 ACK，否则 Nagle 与延迟确认会给每个请求增加约 40ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+                if server._should_fail():
+                    self._send_json(server.error_status, {'error': {'message': 'mock error', 'type': 'server_error'}})
+                    return
+
+                prompt, cached = server._prefill(body)
+                delay = server.latency
+                if server.prefill_rate:
+                    delay += (prompt - cached) / server.prefill_rate
+                if delay:
+                    time.sleep(delay)
+                reply = server._reply(body)
+                reply['prompt_tokens'] = prompt
+                reply['cached_tokens'] = cached
+                if body.get('stream'):
+                    self._stream(body, reply)
+                else:
+                    self._block(body, reply)
+
+            def _block(self, body: Dict[str, Any], reply: Dict[str, Any]) -> None:
+                if server.token_rate and reply['tokens']:
+                    time.sleep(len(reply['tokens']) / server.token_rate)
+                message = {'role': 'assistant', 'content': ''.join(reply['tokens']) or None}
+                if reply['tool_calls']:
+                    message['tool_calls'] = reply['tool_calls']
+                self._send_json(200, {
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': message,
+                        'finish_reason': 'tool_calls' if reply['tool_calls'] else 'stop',
+                    }],
+                    'usage': server._usage(reply),
+                })
+
+            def _stream(self, body: Dict[str, Any], reply: Dict[str, Any]) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def event(delta: Dict[str, Any], finish: str=None, **extra) -> None:
+                    chunk = {
+                        'id': 'chatcmpl-mock',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': body.get('model'),
+                        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}] if delta is not None else [],
+                    }
+                    chunk.update(extra)
+                    self._write_chunk(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+
+                delay = 1 / server.token_rate if server.token_rate else 0
+                event({'role': 'assistant', 'content': ''})
+                for token in reply['tokens']:
+                    if delay:
+                        time.sleep(delay)
+                    event({'content': token})
+                for index, call in enumerate(reply['tool_calls'] or ()):
+                    event({'tool_calls': [{'index': index, 'id': call['id'], 'type': 'function',
+                                           'function': {'name': call['function']['name'], 'arguments': ''}}]})
+                    arguments = call['function']['arguments']
+                    for start in range(0, len(arguments), server.fragment):
+                        if delay:
+                            time.sleep(delay)
+                        event({'tool_calls': [{'index': index,
+                                               'function': {'arguments': arguments[start:start + server.fragment]}}]})
+                event({}, 'tool_calls' if reply['tool_calls'] else 'stop')
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    event(None, usage=server._usage(reply))
+                self._write_chunk(b'data: [DONE]\n\n')
+                self._write_chunk(b'')
+
+        return Handler
+
+
+def main(argv: List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description='OpenAI 兼容的模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--token-rate', type=float, default=0)
+    parser.add_argument('--tokens', type=int, default=32)
+    parser.add_argument('--tool-calls', type=int, default=0)
+    parser.add_argument('--fragment', type=int, default=8)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--prefill-rate', type=float, default=0)
+    parser.add_argument('--prompt-cache', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = MockServer(
+        host=args.host, port=args.port, latency=args.latency, token_rate=args.token_rate,
+        tokens=args.tokens, tool_calls=args.tool_calls, fragment=args.fragment, error_rate=args.error_rate,
+        prefill_rate=args.prefill_rate, prompt_cache=args.prompt_cache,
+    )
+    print(f'listening on {server.url}')
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
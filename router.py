@@ -0,0 +1,160 @@
+from typing      import Any, Dict, Iterable, List, Tuple
+from collections import Counter
+import threading
+import json
+import math
+import re
+
+
+# 英文单词/数字，或连续的中日韩字符
+_WORD = re.compile(r'[A-Za-z]+|\d+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+')
+_CAMEL = re.compile(r'(?<=[a-z])(?=[A-Z])')
+
+
+def tokenize(text: str) -> List[str]:
+    '''
+    将文本切分为检索用的词
+
+    英文按单词切分并拆开驼峰与下划线命名，中文等无空格的文字按单字与相邻两字切分
+    '''
+    tokens = []
+    for word in _WORD.findall(_CAMEL.sub(' ', text)):
+        if word.isascii():
+            tokens.append(word.lower())
+        else:
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class ToolRouter:
+    '''
+    按当前对话挑选最相关的工具，减小每次请求携带的工具列表
+
+    对工具名称、描述与参数说明建立 BM25 索引，以最近一条用户消息（及其后的工具结果）为查询，
+    只发送得分最高的 top_k 个工具；固定工具与本轮已调用过的工具总是包含在内。
+    命中查询的工具不足 top_k 个时（如“好的，继续”），先沿用上一次选中的工具，再按原顺序补足
+    '''
+    def __init__(self, top_k: int=8, pinned: Iterable[str]=(), k1: float=1.5, b: float=0.75) -> None:
+        '''
+        Args:
+            top_k: 每次请求最多携带的非固定工具数量
+            pinned: 总是携带的工具名称
+            k1: BM25 的词频饱和参数
+            b: BM25 的文档长度归一化参数
+        '''
+        self.top_k = top_k
+        self.pinned = set(pinned)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._index: Tuple[Any, ...] = (None,)
+        self._last: Tuple[Any, ...] = (None, None, None)
+
+    def _build_index(self, schema: Any) -> Tuple[Any, ...]:
+        documents = []
+        for tool in schema.tools:
+            function = tool['function']
+            name = function['name']
+            parameters = function.get('parameters') or {}
+            text = [name, name, function.get('description') or '']
+            for param, info in (parameters.get('properties') or {}).items():
+                text.append(param)
+                if isinstance(info, dict):
+                    text.append(str(info.get('description') or ''))
+            documents.append(Counter(tokenize(' '.join(text))))
+
+        frequency = Counter()
+        for document in documents:
+            frequency.update(document.keys())
+        count = len(documents)
+        idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+        lengths = [sum(document.values()) for document in documents]
+        average = sum(lengths) / count if count else 0
+        return (schema, documents, lengths, average, idf)
+
+    def scores(self, schema: Any, query: str) -> List[float]:
+        '''返回 schema 中每个工具对查询的 BM25 得分'''
+        with self._lock:
+            if self._index[0] is not schema:
+                self._index = self._build_index(schema)
+            _, documents, lengths, average, idf = self._index
+
+        terms = [term for term in set(tokenize(query)) if term in idf]
+        k1, b = self.k1, self.b
+        scores = []
+        for document, length in zip(documents, lengths):
+            score = 0.0
+            norm = k1 * (1 - b + b * length / average) if average else k1
+            for term in terms:
+                tf = document.get(term)
+                if tf:
+                    score += idf[term] * tf * (k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    @staticmethod
+    def _turn(messages: List[Dict]) -> Tuple[str, Tuple[str, ...]]:
+        '''取最近一条用户消息之后的文本作为查询，并收集其后已调用的工具'''
+        start = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].get('role') == 'user':
+                start = i
+                break
+        text = []
+        called = []
+        for message in messages[start:]:
+            content = message.get('content')
+            if isinstance(content, str):
+                text.append(content)
+            elif isinstance(content, list):
+                text.extend(part.get('text', '') for part in content if isinstance(part, dict))
+            for call in message.get('tool_calls') or ():
+                called.append(call['function']['name'])
+        return '\n'.join(text), tuple(called)
+
+    def select(self, schema: Any, messages: List[Dict]) -> Any:
+        '''
+        挑选本轮请求携带的工具
+
+        Args:
+            schema: Identify.req_tools 返回的完整工具列表
+            messages: 对话历史
+
+        Returns:
+            ToolSchema: 挑选后的工具列表，查询与工具均未变化时返回同一个对象
+        '''
+        if len(schema.tools) <= self.top_k:
+            return schema
+
+        query, called = self._turn(messages)
+        key = (query, called, self.top_k, frozenset(self.pinned))
+        last_schema, last_key, last = self._last
+        if last_schema is schema and last_key == key:
+            return last
+
+        keep = self.pinned.union(called)
+        scores = self.scores(schema, query)
+        candidates = [i for i, tool in enumerate(schema.tools) if tool['function']['name'] not in keep]
+        ranked = sorted((i for i in candidates if scores[i] > 0), key=lambda i: -scores[i])[:self.top_k]
+        if len(ranked) < self.top_k:
+            previous = {tool['function']['name'] for tool in last.tools} if last is not None else set()
+            chosen = set(ranked)
+            rest = sorted(
+                (i for i in candidates if i not in chosen),
+                key=lambda i: schema.tools[i]['function']['name'] not in previous
+            )
+            ranked += rest[:self.top_k - len(ranked)]
+        chosen = set(ranked)
+        tools = tuple(
+            tool for i, tool in enumerate(schema.tools)
+            if i in chosen or tool['function']['name'] in keep
+        )
+        selected = type(schema)(
+            version = schema.version,
+            strict  = schema.strict,
+            tools   = tools,
+            payload = json.dumps(tools, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+        )
+        self._last = (schema, key, selected)
+        return selected
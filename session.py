@@ -0,0 +1,240 @@
+from typing             import Any, AsyncIterator, Callable, Dict, List
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections        import OrderedDict
+from contextlib         import asynccontextmanager
+from .identify          import AsyncMind, Identify, Endpoint, EndpointPool
+from .store             import MemoryStore, SQLiteStore
+import asyncio
+
+
+class _StoreWriter(MemoryStore):
+    '''
+    在后台线程中按提交顺序执行 store 的写入，写入不阻塞事件循环
+
+    读取排在已提交的写入之后执行，总能读到之前追加的消息；
+    后台写入的错误在下一次 flush 时抛出
+    '''
+    def __init__(self, store: MemoryStore) -> None:
+        self.store = store
+        self.error: BaseException = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='session-store')
+
+    def _write(self, method: Callable, *args) -> None:
+        self._executor.submit(method, *args).add_done_callback(self._check)
+
+    def _check(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None and self.error is None:
+            self.error = future.exception()
+
+    def load(self, session_id: str) -> List[Dict]:
+        return self._executor.submit(self.store.load, session_id).result()
+
+    def append(self, session_id: str, messages: List[Dict]) -> None:
+        self._write(self.store.append, session_id, list(messages))
+
+    def truncate(self, session_id: str, count: int) -> None:
+        self._write(self.store.truncate, session_id, count)
+
+    def clear(self, session_id: str) -> None:
+        self._write(self.store.clear, session_id)
+
+    def compact(self, session_id: str=None) -> None:
+        self._write(self.store.compact, session_id)
+
+    def sessions(self) -> List[str]:
+        return self._executor.submit(self.store.sessions).result()
+
+    def flush(self) -> None:
+        '''等待已提交的写入完成'''
+        self._executor.submit(lambda: None).result()
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class SessionManager:
+    '''
+    在一个进程中承载大量会话
+
+    所有会话共用同一个 Identify 与客户端连接池（Mind.clients），历史保存在 store 中，
+    读写在后台线程中进行，不阻塞事件循环；
+    内存中只保留最近使用的 max_sessions 个会话，空闲会话按 LRU 淘汰，再次访问时从 store 重新加载。
+    请求先获取会话自己的并发额度，再排队获取全局额度，单个会话的大量请求不会挤占其他会话
+    '''
+    def __init__(self,
+                 model: str|Endpoint|List[Endpoint]|EndpointPool,
+                 key: str=None,
+                 endpoint: str=None,
+                 identify: Identify=None,
+                 store: MemoryStore=None,
+                 max_sessions: int=1024,
+                 max_concurrency: int=16,
+                 session_concurrency: int=1,
+                 mind_class: type=AsyncMind,
+                 **options) -> None:
+        '''
+        Args:
+            model: 模型名称或端点，与 Mind 相同；传入 EndpointPool 时所有会话共用其负载均衡与熔断状态
+            key: API 密钥
+            endpoint: 接口地址
+            identify: 所有会话共用的工具注册表，为None时创建一个新的
+            store: 会话历史的持久化后端，为None时使用内存中的 SQLiteStore，进程退出后历史不保留
+            max_sessions: 内存中最多保留的会话数量
+            max_concurrency: 全部会话同时进行的请求数量上限
+            session_concurrency: 单个会话同时进行的请求数量上限
+            mind_class: 会话使用的 Mind 类，需要是 AsyncMind 或其子类
+            **options: 创建 Mind 时的其他参数，如 max_rounds
+        '''
+        self.model = model
+        self.key = key
+        self.endpoint = endpoint
+        self.idf: Identify = identify or Identify()
+        self.store: MemoryStore = store if store is not None else SQLiteStore(':memory:')
+        self.max_sessions = max_sessions
+        self.session_concurrency = session_concurrency
+        self.mind_class = mind_class
+        self.options = options
+
+        # 新建或重新加载会话时的回调，可用于设置提示词、context_window 等
+        self.on_create: Callable[[AsyncMind], Any] = None
+        self.evictions = 0
+
+        self._sessions: OrderedDict[str, AsyncMind] = OrderedDict()
+        self._busy: Dict[str, int] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._writer = _StoreWriter(self.store)
+
+    def get(self, session_id: str) -> AsyncMind:
+        '''
+        获取会话，不在内存中时创建并从 store 加载历史
+
+        Args:
+            session_id: 会话ID
+        '''
+        mind = self._sessions.get(session_id)
+        if mind is not None:
+            self._sessions.move_to_end(session_id)
+            return mind
+
+        mind = self.mind_class(
+            self.model, self.key, self.endpoint,
+            identify   = self.idf,
+            store      = self._writer,
+            session_id = session_id,
+            **self.options
+        )
+        if self.on_create:
+            self.on_create(mind)
+        self._sessions[session_id] = mind
+        self._evict()
+        return mind
+
+    def _evict(self) -> None:
+        '''淘汰最久未使用的空闲会话，历史已在 store 中，直接丢弃内存中的对象即可'''
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        victims = []
+        for session_id in self._sessions:
+            if not self._busy.get(session_id):
+                victims.append(session_id)
+                if len(victims) == excess:
+                    break
+        for session_id in victims:
+            del self._sessions[session_id]
+        self.evictions += len(victims)
+
+    @asynccontextmanager
+    async def session(self, session_id: str) -> AsyncIterator[AsyncMind]:
+        '''
+        获取会话的并发额度，在额度内独占使用该会话
+
+        用法:
+            async with manager.session('user-1') as mind:
+                mind.add_content('user', '你好')
+                result = await mind.request()
+        '''
+        self._busy[session_id] = self._busy.get(session_id, 0) + 1
+        limit = self._limits.get(session_id)
+        if limit is None:
+            limit = self._limits[session_id] = asyncio.Semaphore(self.session_concurrency)
+        try:
+            async with limit:
+                async with self._global:
+                    fresh = session_id not in self._sessions
+                    mind = self.get(session_id)
+                    if fresh:
+                        # 在线程中加载历史，不阻塞事件循环
+                        await asyncio.to_thread(lambda: mind._memories)
+                    yield mind
+        finally:
+            busy = self._busy[session_id] - 1
+            if busy:
+                self._busy[session_id] = busy
+            else:
+                del self._busy[session_id]
+                del self._limits[session_id]
+            self._evict()
+
+    async def request(self, session_id: str, content: Any=None, role: str='user', **kwargs) -> dict:
+        '''
+        在会话中追加一条消息并请求模型
+
+        Args:
+            session_id: 会话ID
+            content: 消息内容，为None时不追加消息
+            role: 消息角色
+            **kwargs: 传给 Mind.request 的参数
+
+        Returns:
+            dict: 与 Mind.request 相同
+        '''
+        async with self.session(session_id) as mind:
+            if content is not None:
+                mind.add_content(role, content)
+            return await mind.request(**kwargs)
+
+    async def stream(self, session_id: str, content: Any=None, role: str='user', **kwargs) -> AsyncIterator[dict]:
+        '''request 的流式版本，逐块返回 Mind.request(stream=True) 的事件'''
+        async with self.session(session_id) as mind:
+            if content is not None:
+                mind.add_content(role, content)
+            async for event in mind.request(stream=True, **kwargs):
+                yield event
+
+    def drop(self, session_id: str, clear: bool=False) -> None:
+        '''
+        将会话移出内存
+
+        Args:
+            session_id: 会话ID
+            clear: 是否同时删除 store 中的历史
+        '''
+        self._sessions.pop(session_id, None)
+        if clear:
+            self._writer.clear(session_id)
+
+    async def flush(self) -> None:
+        '''等待已提交的历史写入完成，后台写入出错时抛出其中第一个错误'''
+        await asyncio.to_thread(self._writer.flush)
+
+    async def aclose(self) -> None:
+        '''等待历史写入完成并停止后台写入线程，store 本身由调用方关闭'''
+        try:
+            await self.flush()
+        finally:
+            self._writer.close()
+
+    @property
+    def resident(self) -> int:
+        '''内存中的会话数量'''
+        return len(self._sessions)
+
+    @property
+    def active(self) -> int:
+        '''正在请求或排队的会话数量'''
+        return len(self._busy)
@@ -0,0 +1,262 @@
+from typing import List, Dict
+import threading
+import sqlite3
+import json
+import os
+import re
+
+
+class MemoryStore:
+    '''
+    对话记忆的持久化后端
+
+    每个会话的消息按顺序追加保存，Mind 在加载会话时一次性读取全部消息
+    '''
+    def load(self, session_id: str) -> List[Dict]:
+        '''读取会话的全部消息，会话不存在时返回空列表'''
+        raise NotImplementedError
+
+    def append(self, session_id: str, messages: List[Dict]) -> None:
+        '''在会话末尾追加消息'''
+        raise NotImplementedError
+
+    def truncate(self, session_id: str, count: int) -> None:
+        '''删除会话末尾的 count 条消息'''
+        raise NotImplementedError
+
+    def clear(self, session_id: str) -> None:
+        '''清空会话'''
+        raise NotImplementedError
+
+    def compact(self, session_id: str=None) -> None:
+        '''压缩存储，session_id 为空时压缩全部会话'''
+        pass
+
+    def sessions(self) -> List[str]:
+        '''返回已保存的会话ID'''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JSONLStore(MemoryStore):
+    '''
+    以 JSONL 文件保存对话，每个会话一个文件
+
+    消息与删除操作都以追加的方式写入，删除记录为 {"$op": ...} 行；
+    compact 会按当前内容重写文件，去掉已被删除的消息与操作记录
+    '''
+    def __init__(self, directory: str, fsync: bool=False, compact_ratio: float=0.5) -> None:
+        '''
+        Args:
+            directory: 保存会话文件的目录
+            fsync: 每次写入后是否调用 fsync
+            compact_ratio: 加载时若已删除的行数超过该比例，自动压缩该会话
+        '''
+        self.directory = directory
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        if not re.fullmatch(r'[\w\-.]+', session_id) or session_id.startswith('.'):
+            raise ValueError(f"非法的会话ID: '{session_id}'")
+        return os.path.join(self.directory, f'{session_id}.jsonl')
+
+    def _write(self, session_id: str, lines: List[str], mode: str='a') -> None:
+        with open(self._path(session_id), mode, encoding='utf-8') as f:
+            f.write(''.join(lines))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _replay(self, session_id: str) -> tuple:
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return [], 0
+        with open(path, encoding='utf-8') as f:
+            text = f.read().strip()
+        if not text:
+            return [], 0
+        # 一次解析整个文件，比逐行 json.loads 快得多
+        try:
+            records = json.loads('[' + text.replace('\n', ',') + ']')
+        except ValueError:
+            records = self._repair(session_id, text)
+        if '"$op"' not in text:
+            return records, 0
+
+        messages = []
+        for record in records:
+            op = record.get('$op')
+            if op is None:
+                messages.append(record)
+            elif op == 'truncate':
+                del messages[max(len(messages) - record['count'], 0):]
+            elif op == 'clear':
+                messages = []
+        return messages, len(records) - len(messages)
+
+    def _repair(self, session_id: str, text: str) -> List[Dict]:
+        '''
+        逐行解析并丢弃无法解析的行（通常是写入中断留下的半行），再重写文件，
+        以免之后追加的内容接在半行之后
+        '''
+        records = []
+        lines = []
+        for line in text.split('\n'):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records.append(record)
+            lines.append(line + '\n')
+        path = self._path(session_id)
+        temp = path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        return records
+
+    def load(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            messages, dead = self._replay(session_id)
+            if dead and dead > self.compact_ratio * (len(messages) + dead):
+                self._rewrite(session_id, messages)
+        return messages
+
+    def append(self, session_id: str, messages: List[Dict]) -> None:
+        if not messages:
+            return
+        lines = [json.dumps(m, ensure_ascii=False, separators=(',', ':')) + '\n' for m in messages]
+        with self._lock:
+            self._write(session_id, lines)
+
+    def truncate(self, session_id: str, count: int) -> None:
+        with self._lock:
+            self._write(session_id, [json.dumps({'$op': 'truncate', 'count': count}) + '\n'])
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            path = self._path(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _rewrite(self, session_id: str, messages: List[Dict]) -> None:
+        path = self._path(session_id)
+        temp = path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            for m in messages:
+                f.write(json.dumps(m, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+
+    def compact(self, session_id: str=None) -> None:
+        targets = [session_id] if session_id else self.sessions()
+        with self._lock:
+            for sid in targets:
+                messages, dead = self._replay(sid)
+                if dead:
+                    self._rewrite(sid, messages)
+
+    def sessions(self) -> List[str]:
+        return [
+            name[:-len('.jsonl')] for name in os.listdir(self.directory)
+            if name.endswith('.jsonl')
+        ]
+
+
+class SQLiteStore(MemoryStore):
+    '''
+    以 SQLite（WAL 模式）保存对话，所有会话共用一个数据库文件
+    '''
+    def __init__(self, path: str, synchronous: str='NORMAL') -> None:
+        '''
+        Args:
+            path: 数据库文件路径
+            synchronous: SQLite 的 synchronous 设置，WAL 模式下 NORMAL 即可保证一致性
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={synchronous}')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            ' session TEXT NOT NULL,'
+            ' seq INTEGER NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' PRIMARY KEY (session, seq)'
+            ') WITHOUT ROWID'
+        )
+        self._next: Dict[str, int] = {}
+
+    def _next_seq(self, session_id: str) -> int:
+        seq = self._next.get(session_id)
+        if seq is None:
+            row = self._db.execute(
+                'SELECT MAX(seq) FROM messages WHERE session = ?', (session_id,)
+            ).fetchone()
+            seq = 0 if row[0] is None else row[0] + 1
+        return seq
+
+    def load(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT data FROM messages WHERE session = ? ORDER BY seq', (session_id,)
+            ).fetchall()
+        if not rows:
+            return []
+        return json.loads('[' + ','.join(row[0] for row in rows) + ']')
+
+    def append(self, session_id: str, messages: List[Dict]) -> None:
+        if not messages:
+            return
+        with self._lock:
+            seq = self._next_seq(session_id)
+            rows = [
+                (session_id, seq + i, json.dumps(m, ensure_ascii=False, separators=(',', ':')))
+                for i, m in enumerate(messages)
+            ]
+            # isolation_level=None 时连接不会自动开启事务，需显式包住整批写入
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT INTO messages (session, seq, data) VALUES (?, ?, ?)', rows)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._next[session_id] = seq + len(rows)
+
+    def truncate(self, session_id: str, count: int) -> None:
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM messages WHERE session = ? AND seq IN '
+                '(SELECT seq FROM messages WHERE session = ? ORDER BY seq DESC LIMIT ?)',
+                (session_id, session_id, count)
+            )
+            self._next.pop(session_id, None)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM messages WHERE session = ?', (session_id,))
+            self._next.pop(session_id, None)
+
+    def compact(self, session_id: str=None) -> None:
+        # 将 WAL 写回主库并截断，回收已删除记录占用的空间
+        with self._lock:
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.execute('VACUUM')
+
+    def sessions(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT DISTINCT session FROM messages')]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
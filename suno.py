@@ -0,0 +1,332 @@
+'''
+Suno 批量生成任务
+
+用法:
+    async with SunoClient(key=...) as suno:
+        jobs = await suno.run([{'tags': 'funky bass', 'title': 'Groove', ...}, ...])
+
+任务状态保存在 state 文件中，中断后以相同参数再次运行时只处理未完成的任务
+'''
+from typing      import Any, Callable, Dict, Iterable, List, Union
+from dataclasses import dataclass, field, asdict
+import asyncio
+import hashlib
+import random
+import httpx
+import json
+import time
+import os
+
+
+# fetch 返回的最终状态
+_SUCCESS = {'SUCCESS', 'COMPLETE', 'COMPLETED'}
+_FAILURE = {'FAILURE', 'FAILED', 'ERROR'}
+
+
+@dataclass
+class SunoJob:
+    '''
+    单个生成任务
+
+    Attributes:
+        key: 任务键，默认为参数的哈希，用于在 state 文件中识别任务
+        payload: 提交给 /suno/submit/music 的参数
+        task_id: 提交后返回的任务ID
+        status: pending / submitted / succeeded / downloaded / failed
+        progress: 服务端返回的进度或状态
+        clips: 生成的音频信息（含 audio_url）
+        files: 已下载的音频文件路径
+        error: 失败原因
+    '''
+    key: str
+    payload: Dict[str, Any]
+    task_id: str = None
+    status: str = 'pending'
+    progress: str = None
+    clips: List[Dict[str, Any]] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    error: str = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('downloaded', 'failed')
+
+
+class SunoJobStore:
+    '''以 JSON 文件保存任务状态，每次更新都原子地重写整个文件'''
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.jobs: Dict[str, SunoJob] = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for data in json.load(f):
+                    job = SunoJob(**data)
+                    self.jobs[job.key] = job
+
+    def save(self) -> None:
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump([asdict(job) for job in self.jobs.values()], f, ensure_ascii=False, indent=1)
+        os.replace(temp, self.path)
+
+
+class SunoError(Exception):
+    pass
+
+
+class SunoClient:
+    '''
+    Suno 批量任务客户端
+
+    - 接口请求共用一个 httpx.AsyncClient 连接池，并发数由 concurrency 限制
+    - 音频使用不携带 API 密钥的单独连接池下载，密钥不会发送给存放音频的 CDN
+    - 所有未完成任务在同一个循环中轮询，每个任务的间隔按指数退避增长并加入随机抖动，状态变化时重置
+    - 任务状态保存在 state 文件中，可断点续跑
+    - 生成的音频以流式下载到 output 目录
+    '''
+    def __init__(self,
+                 key: str=None,
+                 base_url: str='https://yunwu.ai',
+                 concurrency: int=8,
+                 state: str='suno_jobs.json',
+                 output: str='suno',
+                 poll_interval: float=5,
+                 max_poll_interval: float=60,
+                 timeout: float=1800,
+                 retries: int=3,
+                 transport: httpx.AsyncBaseTransport=None) -> None:
+        '''
+        Args:
+            key: API 密钥，为None时读取环境变量 SUNO_API_KEY
+            base_url: 接口地址
+            concurrency: 同时进行的请求数量（提交、轮询与下载共用）
+            state: 任务状态文件，为None时不保存
+            output: 音频下载目录，为None时不下载
+            poll_interval: 首次轮询的间隔（秒）
+            max_poll_interval: 轮询间隔的上限（秒）
+            timeout: 单个任务从提交到完成的最长时间（秒）
+            retries: 请求遇到网络错误、429 或 5xx 时的重试次数
+            transport: 自定义的 httpx 传输层，可用于连接本地的模拟服务
+        '''
+        key = key or os.environ.get('SUNO_API_KEY')
+        if not key:
+            raise ValueError("未提供 API 密钥，请传入 key 或设置环境变量 SUNO_API_KEY")
+        self.concurrency = concurrency
+        self.output = output
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.retries = retries
+        self.store = SunoJobStore(state) if state else None
+        self.on_update: Callable[[SunoJob], Any] = None
+
+        self._http = httpx.AsyncClient(
+            base_url  = base_url,
+            headers   = {'Accept': 'application/json', 'Authorization': f'Bearer {key}'},
+            timeout   = httpx.Timeout(60, connect=10),
+            limits    = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            transport = transport,
+        )
+        self._download = httpx.AsyncClient(
+            timeout          = httpx.Timeout(60, connect=10),
+            limits           = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            transport        = transport,
+            follow_redirects = True,
+        )
+        self._semaphore: asyncio.Semaphore = None
+
+    async def __aenter__(self) -> 'SunoClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+        await self._download.aclose()
+
+    @staticmethod
+    def job_key(payload: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+    def _update(self, job: SunoJob) -> None:
+        if self.store is not None:
+            self.store.jobs[job.key] = job
+            self.store.save()
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except: pass
+
+    async def _request(self, method: str, url: str, **kwargs) -> Any:
+        '''发送请求并返回 JSON，网络错误、429 与 5xx 按指数退避重试'''
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._http.request(method, url, **kwargs)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = SunoError(f"{method} {url} 返回 {response.status_code}")
+            except httpx.TransportError as e:
+                error = e
+            if attempt < self.retries:
+                await asyncio.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.5))
+        raise error
+
+    async def submit(self, job: SunoJob) -> None:
+        data = await self._request('POST', '/suno/submit/music', json=job.payload)
+        task_id = data.get('data') if isinstance(data, dict) else None
+        if not isinstance(task_id, str) or not task_id:
+            raise SunoError(f"提交失败: {data}")
+        job.task_id = task_id
+        job.status = 'submitted'
+        self._update(job)
+
+    async def fetch(self, job: SunoJob) -> bool:
+        '''
+        查询任务状态
+
+        Returns:
+            bool: 状态是否发生变化
+        '''
+        data = await self._request('GET', f'/suno/fetch/{job.task_id}')
+        task = data.get('data') if isinstance(data, dict) else None
+        if not isinstance(task, dict):
+            raise SunoError(f"查询失败: {data}")
+
+        status = str(task.get('status') or '').upper()
+        progress = task.get('progress') or status
+        changed = progress != job.progress
+        job.progress = progress
+        if status in _SUCCESS:
+            clips = task.get('data')
+            job.clips = clips if isinstance(clips, list) else []
+            job.status = 'succeeded'
+            changed = True
+        elif status in _FAILURE:
+            job.status = 'failed'
+            job.error = task.get('fail_reason') or status
+            changed = True
+        if changed:
+            self._update(job)
+        return changed
+
+    async def download(self, job: SunoJob) -> None:
+        '''以流式下载任务生成的全部音频，先写入临时文件再重命名'''
+        os.makedirs(self.output, exist_ok=True)
+        files = []
+        for index, clip in enumerate(job.clips):
+            url = clip.get('audio_url')
+            if not url:
+                continue
+            path = os.path.join(self.output, f"{job.key}-{index}{os.path.splitext(url.split('?')[0])[1] or '.mp3'}")
+            if not os.path.exists(path):
+                temp = path + '.part'
+                async with self._semaphore:
+                    async with self._download.stream('GET', self._http.base_url.join(url)) as response:
+                        response.raise_for_status()
+                        with open(temp, 'wb') as f:
+                            async for chunk in response.aiter_bytes(64 * 1024):
+                                f.write(chunk)
+                os.replace(temp, path)
+            files.append(path)
+        job.files = files
+        job.status = 'downloaded'
+        self._update(job)
+
+    def _fail(self, job: SunoJob, error: BaseException) -> None:
+        job.status = 'failed'
+        job.error = str(error) or type(error).__name__
+        self._update(job)
+
+    async def _submit_all(self, jobs: List[SunoJob]) -> None:
+        async def submit(job: SunoJob) -> None:
+            try:
+                await self.submit(job)
+            except Exception as e:
+                self._fail(job, e)
+        await asyncio.gather(*(submit(job) for job in jobs))
+
+    async def _poll_all(self, jobs: List[SunoJob]) -> None:
+        '''在同一个循环中轮询全部任务，每次只查询到期的任务'''
+        now = time.monotonic()
+        interval = {job.key: self.poll_interval for job in jobs}
+        due = {job.key: now + self.poll_interval * random.uniform(0.5, 1.5) for job in jobs}
+        deadline = now + self.timeout
+        pending = {job.key: job for job in jobs}
+
+        async def poll(job: SunoJob) -> None:
+            try:
+                changed = await self.fetch(job)
+            except Exception as e:
+                # 查询出错时按未变化处理，继续退避
+                changed = False
+                job.error = str(e)
+            if job.status != 'submitted':
+                pending.pop(job.key, None)
+                return
+            # 状态有变化说明任务在推进，缩短间隔；否则指数增长
+            interval[job.key] = self.poll_interval if changed else min(interval[job.key] * 2, self.max_poll_interval)
+            due[job.key] = time.monotonic() + interval[job.key] * random.uniform(0.5, 1.5)
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                for job in list(pending.values()):
+                    self._fail(job, TimeoutError("等待任务完成超时"))
+                return
+            ready = [job for key, job in pending.items() if due[key] <= now]
+            if not ready:
+                await asyncio.sleep(max(min(due[key] for key in pending) - now, 0))
+                continue
+            await asyncio.gather(*(poll(job) for job in ready))
+
+    async def _download_all(self, jobs: List[SunoJob]) -> None:
+        async def download(job: SunoJob) -> None:
+            try:
+                await self.download(job)
+            except Exception as e:
+                self._fail(job, e)
+        await asyncio.gather(*(download(job) for job in jobs))
+
+    def _jobs(self, payloads: Union[Iterable[Dict[str, Any]], Dict[str, Dict[str, Any]]]) -> List[SunoJob]:
+        items = payloads.items() if isinstance(payloads, dict) else ((self.job_key(p), p) for p in payloads)
+        jobs = []
+        for key, payload in items:
+            job = self.store.jobs.get(key) if self.store is not None else None
+            if job is None or job.payload != payload:
+                job = SunoJob(key=key, payload=payload)
+                if self.store is not None:
+                    self.store.jobs[key] = job
+            jobs.append(job)
+        if self.store is not None:
+            self.store.save()
+        return jobs
+
+    async def run(self, payloads: Union[Iterable[Dict[str, Any]], Dict[str, Dict[str, Any]]],
+                  retry_failed: bool=False) -> List[SunoJob]:
+        '''
+        提交并等待一批任务完成
+
+        Args:
+            payloads: 任务参数列表，或任务键到参数的字典
+            retry_failed: 是否重新提交 state 中已失败的任务
+
+        Returns:
+            list: 与 payloads 顺序一致的任务
+        '''
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        jobs = self._jobs(payloads)
+        if retry_failed:
+            for job in jobs:
+                if job.status == 'failed':
+                    # 已生成但下载失败的任务只重新下载，其余重新提交
+                    job.status = 'succeeded' if job.clips else 'pending'
+                    job.error = None
+
+        await self._submit_all([job for job in jobs if job.status == 'pending'])
+        await self._poll_all([job for job in jobs if job.status == 'submitted'])
+        if self.output:
+            await self._download_all([job for job in jobs if job.status == 'succeeded'])
+        return jobs